@@ -1,51 +1,95 @@
 # app.py
 import streamlit as st
 import pandas as pd
-import os, json
-from datetime import date
+from datetime import date, datetime
 from generator import generate_one
-from exporter_wp import publish_to_wordpress
-from utils.fetch_utils import get_country_rate
-from utils.rate_analyzer import get_rate_change
+from exporter_wp import publish_to_wordpress, get_publisher, enqueue_publish, get_outbox, start_outbox_worker
+from utils.dashboard_data import DashboardData
+from utils import publish_ledger as ledger
 
 st.set_page_config(page_title="Currency Reporter", layout="centered")
 st.title("💵 نظام تقارير سعر الدولار اليوم")
 st.caption("معاينة قبل النشر – GPT-5")
 
 CONFIG_PATH = "config/config.json"
-with open(CONFIG_PATH, encoding="utf-8") as f:
-    config = json.load(f)
+
+
+@st.cache_resource
+def dashboard_data():
+    """
+    نسخة واحدة لكل عملية Streamlit تُحدَّث في الخلفية؛ كل إعادة تشغيل للسكربت تقرأ من ذاكرتها.
+    """
+    data = DashboardData(CONFIG_PATH)
+    data.interval = data.config().get("dashboard", {}).get("refresh_seconds", 300)
+    return data.start()
+
+
+@st.cache_resource
+def outbox_worker():
+    """
+    عامل صندوق صادر واحد لكل عملية Streamlit: يعيد إرسال ما فشل نشره من اللوحة
+    (قفل الملف يمنع تداخله مع عامل التشغيل الليلي).
+    """
+    conf = data.config()
+    outbox_conf = conf.get("outbox", {})
+    get_outbox(outbox_conf)
+    return start_outbox_worker(
+        CONFIG_PATH,
+        max_workers=conf.get("pipeline", {}).get("publish_workers", 2),
+        interval=outbox_conf.get("poll_interval", 5),
+    )
+
+
+data = dashboard_data()
+outbox_worker()
+config = data.config()
 all_countries = config["countries"]
 
 st.sidebar.header("⚙️ الإعدادات")
 st.sidebar.write("وضع النشر الافتراضي:", config["wordpress"].get("publish_status", "draft"))
 
 pick = st.multiselect("اختر دولًا للمعاينة:", all_countries, default=all_countries)
+if st.sidebar.button("🔄 تحديث الأسعار الآن"):
+    snap = data.refresh(force=True)
+else:
+    snap = data.snapshot()
+    if snap["updated_at"] is None:  # أول تحميل قبل أن يُكمل الخيط الخلفي دورته الأولى
+        snap = data.refresh()
+st.sidebar.caption(f"آخر تحديث للبيانات: {datetime.fromtimestamp(snap['updated_at']):%Y-%m-%d %H:%M:%S}")
 
 if st.button("👀 توليد للمعاينة (بدون نشر)"):
     st.session_state.previews = {}
     for cc in pick:
-        payload = generate_one(cc, preview_only=True)
+        # بث المقال داخل expander خاص بالدولة أثناء توليده؛ البشرنة والميتا بعد اكتمال البث
+        with st.expander(f"⏳ {cc}", expanded=True):
+            live = st.empty()
+            try:
+                payload = generate_one(cc, preview_only=True, on_text=live.markdown)
+            except Exception as e:
+                live.error(f"تعذّر توليد مقال {cc}: {e}")
+                continue
+            live.markdown(payload["html"], unsafe_allow_html=True)
         st.session_state.previews[cc] = payload
     st.success("تم توليد المقالات للمعاينة.")
 
 st.subheader("📊 أحدث الأسعار")
 rows = []
-for c in pick:
-    try:
-        rate = get_country_rate(c)
-        change = get_rate_change("data/rates_history.csv", rate["country"])
-        rows.append({
-            "الدولة": rate["country"],
-            "العملة": rate["currency"],
-            "شراء": rate["buy"],
-            "بيع": rate["sell"],
-            "المصدر": rate.get("source", ""),
-            "الاتجاه": change["direction"],
-            "نسبة التغير %": change["change"]
-        })
-    except Exception as e:
-        rows.append({"الدولة": c, "خطأ": str(e)})
+rates = {c: snap["rates"][c] for c in pick if c in snap["rates"]}
+changes = snap["changes"]
+for c, rate in rates.items():
+    if isinstance(rate, Exception):
+        rows.append({"الدولة": c, "خطأ": str(rate)})
+        continue
+    change = changes[rate["country"]]
+    rows.append({
+        "الدولة": rate["country"],
+        "العملة": rate["currency"],
+        "شراء": rate["buy"],
+        "بيع": rate["sell"],
+        "المصدر": rate.get("source", ""),
+        "الاتجاه": change["direction"],
+        "نسبة التغير %": change["change"]
+    })
 if rows:
     st.table(pd.DataFrame(rows))
 
@@ -60,16 +104,64 @@ else:
             st.write(f"**Meta Description:** {p['meta']['desc']}")
             st.markdown(p["html"], unsafe_allow_html=True)
             if st.button(f"✅ انشر مقال {cc}", key=f"pub_{cc}"):
-                publish_to_wordpress(p["html"], cc, p["meta"])
-                st.success(f"نُشر مقال {cc}.")
+                res = publish_to_wordpress(p["html"], cc, p["meta"])
+                if res["action"] == "failed":
+                    enqueue_publish(p["html"], cc, p["meta"])
+                    st.warning(f"تعذّر نشر {cc} الآن؛ حُفظ في صندوق الصادر وسيُعاد إرساله تلقائيًا.")
+                else:
+                    st.success(f"مقال {cc}: {res['action']} (Post ID {res['post_id']}).")
+                snap = data.refresh()  # ليظهر السجل وصندوق الصادر المحدّثان أدناه
+    if st.button("🚀 انشر كل المقالات المعروضة"):
+        items = [{"html": p["html"], "country_code": cc, "meta": p["meta"]} for cc, p in previews.items()]
+        workers = config.get("pipeline", {}).get("publish_workers", 2)
+        results = get_publisher(CONFIG_PATH).publish_many(items, max_workers=workers)
+        for it, r in zip(items, results):
+            if r["action"] == "failed":
+                enqueue_publish(it["html"], it["country_code"], it["meta"])
+        snap = data.refresh()
+        st.table(pd.DataFrame([
+            {"الدولة": it["country_code"], "النتيجة": r["action"], "Post ID": r["post_id"]}
+            for it, r in zip(items, results)
+        ]))
 
 st.subheader("🗂️ سجل النشر")
-if os.path.exists("data/logs.txt"):
-    with open("data/logs.txt", encoding="utf-8") as f:
-        logs = f.read().strip()
-    st.text_area("Logs", logs, height=200)
-else:
+pending = snap["outbox_pending"]
+if pending:
+    st.warning(f"📬 {len(pending)} مقال(ات) بانتظار إعادة النشر: " + ", ".join(pending))
+# ملخص من الدفتر المنظّم (استعلامات مفهرسة): منشورات اليوم وإخفاقات الشهر
+today_posts = {cc: ledger.post_for(cc) for cc in all_countries}
+month_stats = {r["country"]: r for r in ledger.summary_by_country(date.today().replace(day=1).isoformat())}
+st.table(pd.DataFrame([
+    {
+        "الدولة": cc,
+        "Post ID اليوم": (today_posts[cc] or {}).get("post_id") or "—",
+        "محاولات الشهر": month_stats.get(cc, {}).get("attempts", 0),
+        "إخفاقات الشهر": month_stats.get(cc, {}).get("failures", 0),
+        "متوسط الاستجابة ms": month_stats.get(cc, {}).get("avg_latency_ms") or "—",
+    }
+    for cc in all_countries
+]))
+
+data.logs.poll()  # يقرأ الأسطر المضافة منذ آخر مرة فقط
+if not data.logs.entries:
     st.write("لا يوجد سجل بعد.")
+else:
+    f1, f2, f3 = st.columns(3)
+    log_country = f1.selectbox("الدولة", ["الكل"] + all_countries, key="log_country")
+    log_day = f2.text_input("التاريخ (YYYY-MM-DD)", key="log_day").strip() or None
+    failed_only = f3.checkbox("الإخفاقات فقط", key="log_failed")
+    per_page = 50
+    page = st.number_input("الصفحة", min_value=1, value=1, step=1, key="log_page")
+    entries, total = data.logs.query(
+        country=None if log_country == "الكل" else log_country,
+        date_from=log_day, date_to=log_day, failed_only=failed_only,
+        page=int(page), per_page=per_page,
+    )
+    st.caption(f"{total} مدخل مطابق ضمن آخر {data.logs.capacity} • صفحة {int(page)} من {max(1, -(-total // per_page))}")
+    if entries:
+        st.table(pd.DataFrame([
+            {"التاريخ": e["date"], "الدولة": e["country"], "النتيجة": e["result"]} for e in entries
+        ]))
 
 st.markdown("---")
 st.caption("© 2025 Currency Reporter – Developed by GPT-5")
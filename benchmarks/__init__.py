@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# قياسات أداء محلية (لا تحتاج شبكة). التشغيل: python -m benchmarks.<name>
@@ -0,0 +1,437 @@
+# benchmarks/bench_e2e.py
+# قياس شامل دون شبكة: يشغّل خادمًا محليًا يحاكي كل الخدمات الخارجية ثم يقيس
+# generator.main و generate_one على 5 إلى 500 دولة ويقارن النتائج بخط أساس محفوظ.
+#   - صفحات البنوك المسجّلة (benchmarks/fixtures) و JSON الخاص بـ exchangerate.host،
+#     عبر HTTP_URL_REWRITES في utils.http_utils.
+#   - OpenAI Responses API (/v1/responses) بزمن استجابة قابل للضبط، عبر OPENAI_BASE_URL.
+#   - ووردبريس wp-json/wp/v2/posts (بحث بالـ slug، إنشاء، تحديث).
+# الدول الإضافية وحدات اصطناعية تُسجَّل في sys.modules باسم data_sources.synth_NNNN
+# وتمرّ بنفس مسارات الجلب الحقيقية (صفحات CBE/CBJ/CBI واللقطة المشتركة).
+# كل حجم يعمل في مجلد عمل مؤقت مستقل (config/ و data/ خاصان به).
+#
+# الاستخدام:
+#   python -m benchmarks.bench_e2e                              # 5,50,500 دولة
+#   python -m benchmarks.bench_e2e --sizes 5,50 --llm-latency 0.2
+#   python -m benchmarks.bench_e2e --save-baseline              # حفظ خط الأساس
+#   python -m benchmarks.bench_e2e --tolerance 0.2              # مقارنة (رمز خروج 1 عند التراجع)
+# كل تشغيل دون --save-baseline يُقارن بـ benchmarks/baseline_e2e.json (مسجّل بالقيم الافتراضية
+# على جهاز التطوير)؛ غيابه رمز خروج 2. أعد حفظه عند تغيير الجهاز أو بيئة CI.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_e2e.json")
+
+# (المضيف، بادئة المسار) → صفحة مسجّلة
+PAGE_FIXTURES = [
+    ("www.cbe.org.eg", "/ar/", "cbe_ar.html"),
+    ("www.cbe.org.eg", "/en/", "cbe_en.html"),
+    ("www.cibeg.com", "", "cib.html"),
+    ("www.banquemisr.com", "", "banquemisr.html"),
+    ("www.cbj.gov.jo", "", "cbj.html"),
+    ("cbi.iq", "", "cbi.html"),
+]
+SNAPSHOT_RATES = {"JOD": 0.709, "IQD": 1310.0, "LBP": 89500.0, "SYP": 13000.0, "EGP": 48.55}
+REAL_COUNTRIES = ["jordan", "egypt", "iraq", "lebanon", "syria"]
+MIN_STAGE_SAMPLES = 20
+
+
+# ---------- الخدمات المحلية البديلة ----------
+class FakeServices:
+    def __init__(self, llm_latency: float = 0.05, page_latency: float = 0.0, wp_latency: float = 0.0):
+        self.llm_latency = llm_latency
+        self.page_latency = page_latency
+        self.wp_latency = wp_latency
+        self.pages = {}
+        for host, prefix, name in PAGE_FIXTURES:
+            with open(os.path.join(FIXTURES, name), "rb") as f:
+                self.pages[(host, prefix)] = f.read()
+        self.posts = {}          # slug → post
+        self.next_id = 1
+        self.lock = threading.Lock()
+        self.hits = {"pages": 0, "snapshot": 0, "llm": 0, "wp": 0}
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def rewrites(self):
+        out = {f"https://{host}": f"{self.base_url}/pages/{host}" for host, _, _ in PAGE_FIXTURES}
+        out["https://api.exchangerate.host"] = f"{self.base_url}/exchangerate"
+        return out
+
+    def start(self) -> "FakeServices":
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive كما في الخدمات الحقيقية
+            disable_nagle_algorithm = True  # الرأس والجسم في كتابتين؛ بدونه يضيف delayed ACK ~40ms لكل طلب
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, ctype="application/json; charset=utf-8"):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                n = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(n) or b"{}")
+
+            def _count(self, key):
+                with services.lock:
+                    services.hits[key] += 1
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.startswith("/pages/"):
+                    self._count("pages")
+                    host, _, rest = url.path[len("/pages/"):].partition("/")
+                    time.sleep(services.page_latency)
+                    for (h, prefix), html in services.pages.items():
+                        if h == host and ("/" + rest).startswith(prefix):
+                            return self._send(200, html, "text/html; charset=utf-8")
+                    return self._send(404, {"error": "no fixture"})
+                if url.path.startswith("/exchangerate/"):
+                    self._count("snapshot")
+                    symbols = parse_qs(url.query).get("symbols", [""])[0].split(",")
+                    rates = {s: SNAPSHOT_RATES.get(s, 1.0) for s in symbols if s}
+                    return self._send(200, {"success": True, "base": "USD", "rates": rates})
+                if url.path.startswith("/wp-json/wp/v2/posts"):
+                    self._count("wp")
+                    time.sleep(services.wp_latency)
+                    slug = parse_qs(url.query).get("slug", [""])[0]
+                    with services.lock:
+                        post = services.posts.get(slug)
+                    return self._send(200, [post] if post else [])
+                self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path == "/v1/responses":
+                    self._count("llm")
+                    return self._send(200, services._llm_response(self._body()))
+                if url.path.rstrip("/") == "/wp-json/wp/v2/posts":
+                    self._count("wp")
+                    time.sleep(services.wp_latency)
+                    return self._send(201, services._save_post(self._body()))
+                self._send(404, {"error": "not found"})
+
+            def do_PUT(self):
+                url = urlparse(self.path)
+                if url.path.startswith("/wp-json/wp/v2/posts/"):
+                    self._count("wp")
+                    time.sleep(services.wp_latency)
+                    body = self._body()
+                    body["id"] = int(url.path.rsplit("/", 1)[-1])
+                    return self._send(200, services._save_post(body))
+                self._send(404, {"error": "not found"})
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="bench-fakes", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _llm_response(self, body):
+        from utils.batch_llm import _default_responder
+        time.sleep(self.llm_latency)
+        fmt = ((body.get("text") or {}).get("format") or {})
+        if fmt.get("type") == "json_schema":
+            text = json.dumps({
+                "article": _default_responder({"input": ""}),
+                "titles": ["سعر الدولار اليوم"],
+                "descriptions": ["آخر تحديث لسعر الدولار."],
+            }, ensure_ascii=False)
+        else:
+            text = _default_responder(body)
+        return {
+            "id": "resp_bench", "object": "response", "created_at": int(time.time()),
+            "model": body.get("model"), "status": "completed",
+            "output": [{"type": "message", "id": "msg_bench", "status": "completed", "role": "assistant",
+                        "content": [{"type": "output_text", "text": text, "annotations": []}]}],
+            "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+        }
+
+    def _save_post(self, body):
+        with self.lock:
+            post = self.posts.get(body.get("slug"))
+            if post is None:
+                post = {"id": body.get("id") or self.next_id, "slug": body.get("slug")}
+                self.next_id += 1
+            for k in ("title", "content", "excerpt"):
+                if k in body:
+                    post[k] = {"raw": body[k], "rendered": body[k]}
+            self.posts[post["slug"]] = post
+            return post
+
+
+# ---------- دول اصطناعية ----------
+_KINDS = ("egypt", "page_cbj", "page_cbi", "snapshot")
+
+
+def _synthetic_get_rate(label, kind):
+    def get_rate():
+        from data_sources import egypt, iraq, jordan, lebanon
+        if kind == "egypt":
+            return {**egypt.get_rate(), "country": label}
+        if kind == "snapshot":
+            return {**lebanon.get_rate(), "country": label}
+        if kind == "page_cbj":
+            mid, currency = jordan._from_cbj_scrape() or 0.709, "دينار أردني"
+        else:
+            mid, currency = iraq._from_cbi_scrape() or 1310.0, "دينار عراقي"
+        return {"country": label, "currency": currency, "buy": round(mid, 4), "sell": round(mid * 1.002, 4)}
+    return get_rate
+
+
+def register_synthetic(n: int):
+    """
+    يسجّل n وحدة data_sources.synth_NNNN ويعيد رموزها.
+    """
+    codes = []
+    for i in range(n):
+        cc = f"synth_{i:04d}"
+        name = f"data_sources.{cc}"
+        if name not in sys.modules:
+            mod = types.ModuleType(name)
+            mod.get_rate = _synthetic_get_rate(f"Synth {i:04d}", _KINDS[i % len(_KINDS)])
+            sys.modules[name] = mod
+        codes.append(cc)
+    return codes
+
+
+def countries_for(size: int):
+    return REAL_COUNTRIES[:size] + register_synthetic(max(0, size - len(REAL_COUNTRIES)))
+
+
+# ---------- مجلد العمل ----------
+def make_workspace(countries, services) -> str:
+    work = tempfile.mkdtemp(prefix="bench-e2e-")
+    os.makedirs(os.path.join(work, "config"))
+    os.makedirs(os.path.join(work, "data"))
+    with open(os.path.join(ROOT, "config", "config.json"), encoding="utf-8") as f:
+        config = json.load(f)
+    with open(os.path.join(ROOT, "config", "prompts.json"), encoding="utf-8") as f:
+        prompts = json.load(f)
+
+    config["countries"] = countries
+    config["wordpress"]["url"] = services.base_url + "/wp-json/wp/v2/posts"
+    config.setdefault("http", {})["url_rewrites"] = services.rewrites()
+    config["cache"] = {"rate_ttl": {"default": 0}, "stale_ttl": 0}  # كل جلب يمرّ بالشبكة المحلية
+    config["rate_limits"] = {}
+    config.setdefault("llm_cache", {})["enabled"] = False
+    config.setdefault("incremental", {})["enabled"] = False
+    config["tracing"] = {"enabled": True, "dir": os.path.join("data", "traces")}
+    config.setdefault("outbox", {}).update({"poll_interval": 0.2, "drain_timeout": 300})
+    for i, cc in enumerate(countries):
+        if cc not in prompts:
+            prompts[cc] = prompts[REAL_COUNTRIES[i % len(REAL_COUNTRIES)]]
+
+    with open(os.path.join(work, "config", "config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False)
+    with open(os.path.join(work, "config", "prompts.json"), "w", encoding="utf-8") as f:
+        json.dump(prompts, f, ensure_ascii=False)
+    return work
+
+
+# ---------- القياس ----------
+def _pct(values, p):
+    from utils.tracing import _percentile
+    return round(_percentile(sorted(values), p), 2)
+
+
+def measure(size, services, sample, verbose=False):
+    import generator
+    from utils import tracing
+
+    countries = countries_for(size)
+    work = make_workspace(countries, services)
+    cwd = os.getcwd()
+    out = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        os.chdir(work)
+        with out:
+            # generate_one: زمن مقال واحد تفاعليًا (جلب + نموذج + نشر متزامن)
+            tracing.configure({"enabled": False})
+            generator.generate_one(countries[0], preview_only=False)  # تسخين: استيرادات وعميل OpenAI
+            lat = []
+            for cc in countries[:sample]:
+                t0 = time.perf_counter()
+                generator.generate_one(cc, preview_only=False)
+                lat.append((time.perf_counter() - t0) * 1000.0)
+
+            # generator.main: التشغيل الليلي الكامل حتى تفريغ صندوق الصادر
+            hits_before = dict(services.hits)
+            t0 = time.perf_counter()
+            generator.main([])
+            wall = time.perf_counter() - t0
+            spans = tracing.spans()
+        hits = {k: services.hits[k] - hits_before[k] for k in services.hits}
+        articles = len([n for n in os.listdir(os.path.join(work, "data", "articles")) if n.endswith(".md")])
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+
+    stages = {}
+    for row in tracing.summarize(spans):
+        stages[row["stage"]] = {"p50_ms": round(row["p50_ms"], 2), "p95_ms": round(row["p95_ms"], 2),
+                                "count": row["count"], "errors": row["errors"]}
+    return {
+        "main": {
+            "wall_s": round(wall, 3),
+            "throughput_cps": round(size / wall, 2),
+            "articles": articles,
+            "requests": hits,
+            "stages": stages,
+        },
+        "generate_one": {"n": len(lat), "p50_ms": _pct(lat, 0.5), "p95_ms": _pct(lat, 0.95)},
+    }
+
+
+# ---------- المقارنة بخط الأساس ----------
+def _metrics(result):
+    """
+    مقاييس المقارنة: (الاسم، القيمة، الأعلى أفضل؟). p95 لمرحلة بأقل من MIN_STAGE_SAMPLES
+    عيّنة هو عمليًا أقصى قيمة، فلا يُقارن.
+    """
+    for size, r in result["sizes"].items():
+        yield f"{size}/main.wall_s", r["main"]["wall_s"], False
+        yield f"{size}/main.throughput_cps", r["main"]["throughput_cps"], True
+        yield f"{size}/generate_one.p50_ms", r["generate_one"]["p50_ms"], False
+        yield f"{size}/generate_one.p95_ms", r["generate_one"]["p95_ms"], False
+        for stage, s in r["main"]["stages"].items():
+            if s["count"] < MIN_STAGE_SAMPLES:
+                continue
+            yield f"{size}/stage.{stage}.p95_ms", s["p95_ms"], False
+
+
+def compare(current, baseline, tolerance, min_ms=5.0):
+    """
+    يطبع جدول المقارنة ويعيد عدد التراجعات. زيادة زمنية أقل من min_ms لا تُعدّ تراجعًا
+    مهما كانت نسبتها، لأن ضجيج القياس يطغى على المراحل السريعة.
+    """
+    base = {name: value for name, value, _ in _metrics(baseline)}
+    if current["params"] != baseline.get("params"):
+        print(f"⚠️ params differ from baseline: {baseline.get('params')} → {current['params']}")
+    regressions = 0
+    print(f"{'metric':<40}{'baseline':>12}{'current':>12}{'delta':>9}")
+    for name, value, higher_better in _metrics(current):
+        if name not in base:
+            continue
+        b = base[name]
+        delta = (value - b) / b if b else 0.0
+        worse = -delta if higher_better else delta
+        noisy = name.endswith("_ms") and value - b < min_ms
+        flag = ""
+        if worse > tolerance and not noisy:
+            regressions += 1
+            flag = "  ❌ regression"
+        elif worse < -tolerance:
+            flag = "  ✅ improved"
+        print(f"{name:<40}{b:>12.2f}{value:>12.2f}{delta * 100:>8.1f}%{flag}")
+    return regressions
+
+
+def _print_result(size, r):
+    m = r["main"]
+    print(f"\n=== {size} countries ===")
+    print(f"main: {m['wall_s']:.2f}s  {m['throughput_cps']:.1f} countries/s  articles={m['articles']}  "
+          f"requests={m['requests']}")
+    g = r["generate_one"]
+    print(f"generate_one (n={g['n']}): p50 {g['p50_ms']:.1f} ms  p95 {g['p95_ms']:.1f} ms")
+    print(f"{'stage':<16}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for stage, s in sorted(m["stages"].items(), key=lambda kv: -kv[1]["p95_ms"]):
+        print(f"{stage:<16}{s['count']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['errors']:>8}")
+
+
+def run(sizes, llm_latency, page_latency, wp_latency, sample, verbose=False):
+    services = FakeServices(llm_latency, page_latency, wp_latency).start()
+    # قبل أول استدعاء: عميل OpenAI يُنشأ كسولًا ويقرأ OPENAI_BASE_URL من البيئة
+    os.environ["OPENAI_BASE_URL"] = services.base_url + "/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench-key")
+    for var in ("SINGLE_COUNTRY", "SELECTED_COUNTRIES", "PREVIEW_ONLY"):
+        os.environ.pop(var, None)
+    from utils.http_utils import configure_http
+    configure_http(url_rewrites=services.rewrites())  # generate_one لا يضبط http بنفسه
+
+    result = {"params": {"llm_latency": llm_latency, "page_latency": page_latency,
+                         "wp_latency": wp_latency, "sample": sample},
+              "sizes": {}}
+    try:
+        for size in sizes:
+            r = measure(size, services, min(sample, size), verbose)
+            result["sizes"][str(size)] = r
+            _print_result(size, r)
+    finally:
+        services.stop()
+    return result
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Offline end-to-end benchmark with local fakes")
+    ap.add_argument("--sizes", default="5,50,500", help="أعداد الدول مفصولة بفواصل")
+    ap.add_argument("--llm-latency", type=float, default=0.05, help="زمن رد OpenAI المحاكى (ثوانٍ)")
+    ap.add_argument("--page-latency", type=float, default=0.0, help="زمن صفحات البنوك المحاكى")
+    ap.add_argument("--wp-latency", type=float, default=0.0, help="زمن ووردبريس المحاكى")
+    ap.add_argument("--sample", type=int, default=5, help="عدد استدعاءات generate_one لكل حجم")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="نسبة التراجع المسموحة قبل الإبلاغ")
+    ap.add_argument("--verbose", action="store_true", help="عرض مخرجات generator أثناء القياس")
+    args = ap.parse_args(argv)
+
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    result = run(sizes, args.llm_latency, args.page_latency, args.wp_latency, args.sample, args.verbose)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Baseline saved: {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"\n❌ Baseline not found: {args.baseline} (create it with --save-baseline)")
+        sys.exit(2)
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    common = set(result["sizes"]) & set(baseline.get("sizes", {}))
+    if not common:
+        print(f"\n❌ Baseline has no measured sizes in common with --sizes {args.sizes} "
+              f"(baseline: {','.join(baseline.get('sizes', {})) or 'none'})")
+        sys.exit(2)
+    print()
+    regressions = compare(result, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ {regressions} regression(s) beyond {args.tolerance:.0%}")
+        sys.exit(1)
+    print("\n✅ No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
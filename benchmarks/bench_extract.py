@@ -0,0 +1,97 @@
+# benchmarks/bench_extract.py
+# قياس زمن تحليل صفحات البنوك المحفوظة (benchmarks/fixtures): الطريقة القديمة
+# (BeautifulSoup + find(lambda ... get_text)) مقابل محرك utils.html_extract.
+#
+# الاستخدام:
+#   python -m benchmarks.bench_extract            # 50 تكرارًا لكل صفحة
+#   python -m benchmarks.bench_extract --repeat 200
+
+import argparse
+import os
+import re
+import time
+
+from utils.html_extract import extract_cells, first_number
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+# ---------- الطريقة القديمة (كما كانت في data_sources قبل المحرك) ----------
+def _legacy_cbe(html, marker, fallback_marker):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "lxml")
+    row = soup.find(lambda t: t.name == "tr" and marker in t.get_text(" ", strip=True))
+    if not row:
+        cell = soup.find(lambda t: t.name in ("td", "th") and fallback_marker in t.get_text(" ", strip=True))
+        row = cell.find_parent("tr") if cell else None
+    if not row:
+        return []
+    return [c.get_text(" ", strip=True) for c in row.find_all(["td", "th", "span", "div"])]
+
+def _legacy_block(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "lxml")
+    block = soup.find(lambda t: t.name in ("section", "div", "table") and ("الدولار" in t.get_text(" ", strip=True) or "USD" in t.get_text(" ", strip=True)))
+    if not block:
+        return []
+    return [t.get_text(" ", strip=True) for t in block.find_all(["td", "th", "div", "span", "p"])]
+
+def _legacy_cbj(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    candidates = soup.find_all(["td", "th"])
+    for i, c in enumerate(candidates):
+        txt = (c.get_text(strip=True) or "").upper()
+        if "USD" in txt or "الدولار" in txt:
+            return [x.get_text(strip=True) for x in candidates[max(0, i - 3): i + 6]]
+    return []
+
+def _legacy_cbi(html):
+    from bs4 import BeautifulSoup
+    text = BeautifulSoup(html, "html.parser").get_text(" ", strip=True)
+    for c in re.findall(r"\b(\d{3,4}(?:\.\d{1,3})?)\b", text):
+        v = float(c)
+        if 900.0 <= v <= 2000.0:
+            return v
+    return None
+
+
+CASES = [
+    ("cbe_ar.html", lambda h: _legacy_cbe(h, "الدولار", "الدولار الأمريكي"), lambda h: extract_cells(h, "cbe_ar")),
+    ("cbe_en.html", lambda h: _legacy_cbe(h, "US Dollar", "US Dollar"), lambda h: extract_cells(h, "cbe_en")),
+    ("cib.html", _legacy_block, lambda h: extract_cells(h, "cib")),
+    ("banquemisr.html", _legacy_block, lambda h: extract_cells(h, "banquemisr")),
+    ("cbj.html", _legacy_cbj, lambda h: extract_cells(h, "cbj")),
+    ("cbi.html", _legacy_cbi, lambda h: first_number(h, "cbi")),
+]
+
+
+def _time_ms(fn, html, repeat):
+    fn(html)  # تسخين (تحميل كسول للمكتبات)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(html)
+    return (time.perf_counter() - t0) * 1000.0 / repeat
+
+
+def run(repeat: int = 50):
+    print(f"{'page':<18}{'KB':>7}{'before ms':>12}{'after ms':>11}{'speedup':>9}")
+    for name, legacy, engine in CASES:
+        with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+            html = f.read()
+        before = _time_ms(legacy, html, repeat)
+        after = _time_ms(engine, html, repeat)
+        print(f"{name:<18}{len(html.encode('utf-8')) / 1024:>7.1f}{before:>12.2f}{after:>11.2f}{before / after:>8.1f}x")
+        print(f"{'':<18}legacy={legacy(html)!r:.80}")
+        print(f"{'':<18}engine={engine(html)!r:.80}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="HTML extraction benchmark over saved fixtures")
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args(argv)
+    run(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# benchmarks/bench_humanize.py
+# قياس البشرنة على مدوّنة عربية كبيرة مولّدة: التنفيذ القديم (re.sub/re.search بأنماط
+# نصية ومؤشر تدوير عام) مقابل Humanizer المجمّع، مع التحقق من تطابق الناتج حرفيًا،
+# واختبار تزامن humanize_many من عدة خيوط بمفاتيح دول مختلفة.
+#
+# الاستخدام:
+#   python -m benchmarks.bench_humanize                 # 5000 مقال
+#   python -m benchmarks.bench_humanize --articles 20000 --threads 8
+
+import argparse
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from utils.template_engine import render_article
+from utils.text_utils import (
+    GENERIC_FILLERS, OPENING_PATTERNS, OPENING_VARIANTS, TRANSITIONS, Humanizer,
+)
+
+
+# ---------- التنفيذ القديم (كما كان في utils/text_utils قبل Humanizer) ----------
+_legacy_idx = 0
+
+def _legacy_norm(text):
+    t = re.sub(r"[ \t]+", " ", text)
+    t = re.sub(r"\n{3,}", "\n\n", t)
+    return t.strip()
+
+def _legacy_rotate(text):
+    global _legacy_idx
+    for pat in OPENING_PATTERNS:
+        m = re.search(pat, text, flags=re.U | re.M)
+        if m and m.start() == 0:
+            replacement = OPENING_VARIANTS[_legacy_idx % len(OPENING_VARIANTS)]
+            _legacy_idx += 1
+            text = re.sub(pat, replacement, text, count=1, flags=re.U | re.M)
+            break
+    return text
+
+def _legacy_transition(text):
+    if any(tr in text for tr in TRANSITIONS):
+        return text
+    parts = re.split(r"\n\s*\n", text, maxsplit=1)
+    if len(parts) == 2:
+        return parts[0] + "\n\n" + TRANSITIONS[0] + " " + parts[1]
+    words = text.split()
+    if len(words) > 40:
+        mid = len(words) // 2
+        return " ".join(words[:mid] + [TRANSITIONS[0]] + words[mid:])
+    return text
+
+def _legacy_clamp(text, min_words, max_words):
+    words = text.split()
+    n = len(words)
+    if n > max_words:
+        t = text
+        for pat in GENERIC_FILLERS:
+            t = re.sub(pat, "", t)
+        t = _legacy_norm(t)
+        words2 = t.split()
+        if len(words2) <= max_words:
+            return t
+        preview = " ".join(words2[:max_words + 20])
+        cut = re.search(r"[\.!\؟]\s*[^\.\!\؟]*$", preview)
+        if cut:
+            return preview[:cut.start()].strip()
+        return " ".join(words2[:max_words]).strip()
+    if n < min_words:
+        suffix = (
+            " وبشكل عام، تبدو حركة الصرف مرهونة بتطورات السيولة وقرارات السياسة النقدية "
+            "خلال اليومين المقبلين، مع متابعة حذرة من المتعاملين."
+        )
+        return (text.rstrip() + " " + suffix).strip()
+    return text
+
+def legacy_humanize(text, min_words=140, max_words=220):
+    t = _legacy_norm(text)
+    t = _legacy_rotate(t)
+    t = _legacy_transition(t)
+    t = _legacy_clamp(t, min_words, max_words)
+    return _legacy_norm(t)
+
+
+# ---------- مدوّنة الاختبار ----------
+_COUNTRIES = [
+    ("jordan", "الأردن", "دينار"), ("egypt", "مصر", "جنيه"), ("iraq", "العراق", "دينار"),
+    ("lebanon", "لبنان", "ليرة"), ("syria", "سوريا", "ليرة"),
+]
+_OPENERS = ["يواصل الدولار", "يشهد سعر الدولار", "سجل سعر الدولار", "استقر سعر الدولار", "بلغ سعر الدولار"]
+_FILLERS = ["ومن الجدير بالذكر أن", "تجدر الإشارة إلى أن", "لا بد من الإشارة إلى أن", "يجدر التنويه بأن"]
+
+
+def build_corpus(n, seed=7):
+    """
+    مقالات متنوعة الطول والبنية: افتتاحيات نمطية، حشو، مسافات وتبويبات وأسطر زائدة،
+    نصوص بلا وصلات انتقالية، وأخرى طويلة تتجاوز الحد الأعلى أو قصيرة دون الأدنى.
+    """
+    rnd = random.Random(seed)
+    start = date(2025, 1, 1)
+    corpus = []
+    for i in range(n):
+        cc, name, cur = _COUNTRIES[i % len(_COUNTRIES)]
+        buy = round(rnd.uniform(0.5, 90000), 2)
+        rate = {"buy": buy, "sell": round(buy * 1.002, 2), "currency": cur, "country": name}
+        change = {"change": round(rnd.uniform(-2, 2), 2), "direction": rnd.choice(["up", "down", "stable"])}
+        paras = render_article(rate, change, cc, today=(start + timedelta(days=i)).isoformat()).split("\n\n")
+        if rnd.random() < 0.6:
+            paras[0] = f"{rnd.choice(_OPENERS)} {paras[0]}"
+        if rnd.random() < 0.5:
+            paras[2] = f"{rnd.choice(_FILLERS)} {paras[2]}"
+        if rnd.random() < 0.3:
+            paras = [p.replace("في المقابل،", "").replace("من جهة أخرى،", "").replace("على صعيد متصل،", "")
+                     .replace("في الوقت ذاته،", "").replace("يُشار إلى أن", "") for p in paras]
+        if rnd.random() < 0.4:
+            paras += paras[1:4]  # مقال طويل يتجاوز max_words
+        sep = rnd.choice(["\n\n", "\n\n\n\n", "\n \n"])
+        text = sep.join(paras)
+        if rnd.random() < 0.3:
+            text = text.replace(" ", "  \t", 5)
+        corpus.append(text)
+    return corpus
+
+
+def run(n=5000, threads=4):
+    corpus = build_corpus(n)
+    words = sum(len(t.split()) for t in corpus)
+    print(f"corpus: {n} articles, {words} words")
+
+    t0 = time.perf_counter()
+    before = [legacy_humanize(t) for t in corpus]
+    legacy_s = time.perf_counter() - t0
+
+    h = Humanizer()
+    t0 = time.perf_counter()
+    after = h.humanize_many(corpus)
+    engine_s = time.perf_counter() - t0
+
+    mismatches = sum(1 for a, b in zip(before, after) if a != b)
+    print(f"{'legacy':<10}{legacy_s * 1000:>10.1f} ms  ({legacy_s * 1e6 / n:.1f} µs/article)")
+    print(f"{'Humanizer':<10}{engine_s * 1000:>10.1f} ms  ({engine_s * 1e6 / n:.1f} µs/article)"
+          f"  speedup {legacy_s / engine_s:.1f}x  mismatches={mismatches}")
+
+    # تزامن: كل خيط يعالج دولة واحدة بمفتاحها؛ التدوير لكل دولة يبقى متسلسلًا دون تداخل
+    shared = Humanizer()
+    by_country = {cc: [t for i, t in enumerate(corpus) if _COUNTRIES[i % len(_COUNTRIES)][0] == cc]
+                  for cc, _, _ in _COUNTRIES}
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = dict(zip(by_country, pool.map(
+            lambda cc: shared.humanize_many(by_country[cc], keys=[cc] * len(by_country[cc])), by_country)))
+    threaded_s = time.perf_counter() - t0
+    solo = {cc: Humanizer().humanize_many(texts, keys=[cc] * len(texts)) for cc, texts in by_country.items()}
+    consistent = all(results[cc] == solo[cc] for cc in by_country)
+    print(f"{'threads':<10}{threaded_s * 1000:>10.1f} ms  ({threads} workers, per-country rotation consistent={consistent})")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Humanizer benchmark over a generated Arabic corpus")
+    ap.add_argument("--articles", type=int, default=5000)
+    ap.add_argument("--threads", type=int, default=4)
+    args = ap.parse_args(argv)
+    run(args.articles, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,26 @@
 # data_sources/egypt.py
 # جلب أسعار USD→EGP من مصدر رسمي (CBE) مع طبقات احتياط (CIB, Banque Misr, API).
+# الاستخراج من الصفحات عبر محددات utils.html_extract.SPECS (cbe_ar, cbe_en, cib, banquemisr).
 # يعيد قاموسًا: {"country":"Egypt","currency":"جنيه مصري","buy":..,"sell":..,"source":"..."}.
 
 from __future__ import annotations
-import requests
-from bs4 import BeautifulSoup
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from typing import Optional, Tuple
+from utils.html_extract import extract_cells
+from utils.http_utils import http_get
+from utils.rate_snapshot import get_usd_rate
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; CurrencyReporter/1.1; +https://example.com)"
 }
 TIMEOUT = 15
 
+# طريقة تشغيل المصادر: sequential (بالترتيب) | hedged (تحوّط بتأخير) | all (كلها معًا)
+FETCH_MODE = os.getenv("EGYPT_FETCH_MODE", "hedged").strip().lower()
+HEDGE_DELAY = float(os.getenv("EGYPT_HEDGE_DELAY", "1.5"))  # ثوانٍ قبل إطلاق المصدر التالي
+
 # ---------- أدوات ----------
 AR_NUMS = str.maketrans("٠١٢٣٤٥٦٧٨٩٫٬", "0123456789..")
 
@@ -55,17 +63,10 @@ def _pick_two_numbers(cells_texts) -> Tuple[Optional[float], Optional[float]]:
 # ---------- مصادر ----------
 def _from_cbe_exchange_ar() -> Optional[Tuple[float, float, str]]:
     url = "https://www.cbe.org.eg/ar/EconomicResearch/Statistics/Pages/ExchangeRatesListing.aspx"
-    r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
+    r = http_get(url, headers=HEADERS, timeout=TIMEOUT)
     if r.status_code != 200:
         return None
-    soup = BeautifulSoup(r.text, "lxml")
-    row = soup.find(lambda t: t.name == "tr" and "الدولار" in t.get_text(" ", strip=True))
-    if not row:
-        cell = soup.find(lambda t: t.name in ("td","th") and "الدولار الأمريكي" in t.get_text(" ", strip=True))
-        row = cell.find_parent("tr") if cell else None
-    if not row:
-        return None
-    cells = [c.get_text(" ", strip=True) for c in row.find_all(["td","th","span","div"])]
+    cells = extract_cells(r.text, "cbe_ar")
     buy, sell = _pick_two_numbers(cells)
     if buy and sell:
         return buy, sell, "CBE (Arabic)"
@@ -73,17 +74,10 @@ def _from_cbe_exchange_ar() -> Optional[Tuple[float, float, str]]:
 
 def _from_cbe_exchange_en() -> Optional[Tuple[float, float, str]]:
     url = "https://www.cbe.org.eg/en/EconomicResearch/Statistics/Pages/ExchangeRates.aspx"
-    r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
+    r = http_get(url, headers=HEADERS, timeout=TIMEOUT)
     if r.status_code != 200:
         return None
-    soup = BeautifulSoup(r.text, "lxml")
-    row = soup.find(lambda t: t.name == "tr" and "US Dollar" in t.get_text(" ", strip=True))
-    if not row:
-        cell = soup.find(lambda t: t.name in ("td","th") and "US Dollar" in t.get_text(" ", strip=True))
-        row = cell.find_parent("tr") if cell else None
-    if not row:
-        return None
-    cells = [c.get_text(" ", strip=True) for c in row.find_all(["td","th","span","div"])]
+    cells = extract_cells(r.text, "cbe_en")
     buy, sell = _pick_two_numbers(cells)
     if buy and sell:
         return buy, sell, "CBE (English)"
@@ -91,41 +85,29 @@ def _from_cbe_exchange_en() -> Optional[Tuple[float, float, str]]:
 
 def _from_cib_bank() -> Optional[Tuple[float, float, str]]:
     url = "https://www.cibeg.com/ar/exchange-rates"
-    r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
+    r = http_get(url, headers=HEADERS, timeout=TIMEOUT)
     if r.status_code != 200:
         return None
-    soup = BeautifulSoup(r.text, "lxml")
-    block = soup.find(lambda t: t.name in ("section","div","table") and ("الدولار" in t.get_text(" ", strip=True) or "USD" in t.get_text(" ", strip=True)))
-    if not block:
-        return None
-    texts = [t.get_text(" ", strip=True) for t in block.find_all(["td","th","div","span","p"])]
-    buy, sell = _pick_two_numbers(texts)
+    cells = extract_cells(r.text, "cib")
+    buy, sell = _pick_two_numbers(cells)
     if buy and sell:
         return buy, sell, "CIB"
     return None
 
 def _from_banquemisr() -> Optional[Tuple[float, float, str]]:
     url = "https://www.banquemisr.com/ar/rates"
-    r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
+    r = http_get(url, headers=HEADERS, timeout=TIMEOUT)
     if r.status_code != 200:
         return None
-    soup = BeautifulSoup(r.text, "lxml")
-    block = soup.find(lambda t: t.name in ("section","div","table") and ("الدولار" in t.get_text(" ", strip=True) or "USD" in t.get_text(" ", strip=True)))
-    if not block:
-        return None
-    texts = [t.get_text(" ", strip=True) for t in block.find_all(["td","th","div","span","p"])]
-    buy, sell = _pick_two_numbers(texts)
+    cells = extract_cells(r.text, "banquemisr")
+    buy, sell = _pick_two_numbers(cells)
     if buy and sell:
         return buy, sell, "Banque Misr"
     return None
 
 def _from_fallback_api() -> Optional[Tuple[float, float, str]]:
-    url = "https://api.exchangerate.host/latest"
-    params = {"base": "USD", "symbols": "EGP"}
-    r = requests.get(url, params=params, headers=HEADERS, timeout=12)
-    if r.status_code != 200:
-        return None
-    rate = r.json().get("rates", {}).get("EGP")
+    # من اللقطة المشتركة لـ exchangerate.host (طلب واحد لكل العملات)
+    rate = get_usd_rate("EGP")
     if not isinstance(rate, (int, float)):
         return None
     mid = float(rate)
@@ -135,6 +117,55 @@ def _from_fallback_api() -> Optional[Tuple[float, float, str]]:
     sell = round(mid + max(0.05, round(mid * 0.003, 3)), 3)
     return buy, sell, "Exchangerate.host"
 
+# ---------- التنفيذ المتحوّط (hedged) ----------
+def _safe_call(fn):
+    try:
+        return fn()
+    except Exception:
+        return None
+
+def _run_sequential(strategies):
+    for fn in strategies:
+        res = _safe_call(fn)
+        if res:
+            return res
+    return None
+
+def _run_hedged(strategies, hedge_delay: float):
+    """
+    يبدأ المصدر المفضّل، ثم يطلق التالي بعد hedge_delay ثانية إن لم يصل رد صالح
+    (أو فورًا عند فشل مصدر)، ويأخذ أول نتيجة صالحة؛ عند تزامن نتائج يُقدَّم الأعلى أولوية.
+    hedge_delay=0 يطلق كل المصادر دفعة واحدة.
+    المصادر التي لم تبدأ تُلغى؛ الطلبات الجارية تُترك لتنتهي بمهلتها دون انتظار نتيجتها.
+    """
+    pool = ThreadPoolExecutor(max_workers=len(strategies), thread_name_prefix="egypt-hedge")
+    futures = {}
+
+    def _launch():
+        idx = len(futures)
+        futures[pool.submit(_safe_call, strategies[idx])] = idx
+
+    try:
+        _launch()
+        while hedge_delay <= 0 and len(futures) < len(strategies):
+            _launch()
+        while True:
+            more = len(futures) < len(strategies)
+            pending = [f for f in futures if not f.done()]
+            if pending:
+                wait(pending, timeout=hedge_delay if more else None, return_when=FIRST_COMPLETED)
+            valid = sorted((futures[f], f.result()) for f in futures if f.done() and f.result())
+            if valid:
+                return valid[0][1]
+            if not more:
+                if all(f.done() for f in futures):
+                    return None
+                continue
+            # انتهت مهلة التحوّط أو فشل مصدر → أطلق التالي
+            _launch()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
 # ---------- الواجهة ----------
 def get_rate():
     strategies = [
@@ -146,14 +177,12 @@ def get_rate():
     ]
     buy = sell = None
     src = "Unknown"
-    for fn in strategies:
-        try:
-            res = fn()
-        except Exception:
-            res = None
-        if res:
-            buy, sell, src = res
-            break
+    if FETCH_MODE == "sequential":
+        res = _run_sequential(strategies)
+    else:
+        res = _run_hedged(strategies, 0.0 if FETCH_MODE == "all" else HEDGE_DELAY)
+    if res:
+        buy, sell, src = res
     if buy is None or sell is None:
         mid = 60.0
         buy = round(mid, 3)
@@ -3,8 +3,9 @@
 # نعتمد أساسًا على API عام مستقر، مع محاولة سكراب خفيفة من موقع البنك المركزي العراقي كخطة احتياطية.
 
 from __future__ import annotations
-import requests
-from bs4 import BeautifulSoup
+from utils.html_extract import first_number
+from utils.http_utils import http_get
+from utils.rate_snapshot import get_usd_rate
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; CurrencyReporter/1.0; +https://example.com)"
@@ -12,19 +13,10 @@ HEADERS = {
 
 def _from_exchangerate_host() -> float | None:
     """
-    مصدر مجاني مستقر:
-    https://api.exchangerate.host/latest?base=USD&symbols=IQD
-    يعيد معدل USD→IQD (قيمة وسطية عامة).
+    معدل USD→IQD الوسطي العام من لقطة exchangerate.host (utils.rate_snapshot).
+    None إن لم يتوفر، فنجرّب سكراب CBI ثم القيمة الاحتياطية.
     """
-    url = "https://api.exchangerate.host/latest"
-    params = {"base": "USD", "symbols": "IQD"}
-    r = requests.get(url, params=params, headers=HEADERS, timeout=12)
-    if r.status_code == 200:
-        data = r.json()
-        rate = data.get("rates", {}).get("IQD")
-        if isinstance(rate, (int, float)) and rate > 0:
-            return float(rate)
-    return None
+    return get_usd_rate("IQD")
 
 
 def _from_cbi_scrape() -> float | None:
@@ -34,25 +26,12 @@ def _from_cbi_scrape() -> float | None:
     سنلتقط أول رقم منطقي ضمن نطاق الدينار العراقي (900–2000).
     """
     url = "https://cbi.iq"
-    r = requests.get(url, headers=HEADERS, timeout=12)
+    r = http_get(url, headers=HEADERS, timeout=12)
     if r.status_code != 200:
         return None
 
-    soup = BeautifulSoup(r.text, "html.parser")
-    text = soup.get_text(" ", strip=True)
-
-    # التقط أي رقم ضمن نطاق منطقي (قد يظهر مثل 1310.000 أو 1310)
-    import re
-    candidates = re.findall(r"\b(\d{3,4}(?:\.\d{1,3})?)\b", text)
-    # انتقِ أول قيمة تقع ضمن نطاق IQD الشائع
-    for c in candidates:
-        try:
-            v = float(c)
-            if 900.0 <= v <= 2000.0:
-                return v
-        except Exception:
-            pass
-    return None
+    # أول رقم ضمن نطاق IQD الشائع (قد يظهر مثل 1310.000 أو 1310)، مع التوقف عند أول تطابق
+    return first_number(r.text, "cbi")
 
 
 def get_rate():
@@ -4,8 +4,9 @@
 # نعيد قاموسًا موحّدًا: {"country":"Jordan","currency":"دينار أردني","buy":..,"sell":..}
 
 from __future__ import annotations
-import requests
-from bs4 import BeautifulSoup
+from utils.html_extract import extract_cells
+from utils.http_utils import http_get
+from utils.rate_snapshot import get_usd_rate
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; CurrencyReporter/1.0; +https://example.com)"
@@ -13,19 +14,10 @@ HEADERS = {
 
 def _from_exchangerate_host() -> float | None:
     """
-    مصدر مجاني مستقر:
-    https://api.exchangerate.host/latest?base=USD&symbols=JOD
-    يعيد معدل USD→JOD (عادة ~0.709)
+    معدل USD→JOD من لقطة exchangerate.host (utils.rate_snapshot)، عادة ~0.709.
+    None إن لم تتوفر اللقطة، فننتقل إلى صفحة البنك المركزي الأردني.
     """
-    url = "https://api.exchangerate.host/latest"
-    params = {"base": "USD", "symbols": "JOD"}
-    r = requests.get(url, params=params, headers=HEADERS, timeout=12)
-    if r.status_code == 200:
-        data = r.json()
-        rate = data.get("rates", {}).get("JOD")
-        if isinstance(rate, (int, float)) and rate > 0:
-            return float(rate)
-    return None
+    return get_usd_rate("JOD")
 
 
 def _from_cbj_scrape() -> float | None:
@@ -34,28 +26,17 @@ def _from_cbj_scrape() -> float | None:
     هذه الصفحة/البنية قد تتغير، لذا نستخدمها كمحاولة ثانوية فقط.
     """
     url = "https://www.cbj.gov.jo/Pages/viewpage.aspx?pageID=54"  # صفحة أسعار الصرف (قد تتغير)
-    r = requests.get(url, headers=HEADERS, timeout=15)
+    r = http_get(url, headers=HEADERS, timeout=15)
     if r.status_code != 200:
         return None
 
-    soup = BeautifulSoup(r.text, "html.parser")
-
-    # ابحث عن صف USD داخل جدول العملات (هيكل الصفحة قد يختلف، لذلك نحاول بعدة طرق):
-    # 1) أي خلية تحتوي على 'USD' أو 'الدولار الأمريكي'
-    candidates = soup.find_all(["td", "th"])
-    idx = -1
-    for i, c in enumerate(candidates):
-        txt = (c.get_text(strip=True) or "").upper()
-        if "USD" in txt or "الدولار" in txt:
-            idx = i
-            break
-
-    if idx == -1:
+    # ابحث عن صف USD داخل جدول العملات (هيكل الصفحة قد يختلف):
+    # أول خلية تحتوي على 'USD' أو 'الدولار' مع 3 خلايا قبلها و5 بعدها (محدد "cbj")
+    window = extract_cells(r.text, "cbj")
+    if not window:
         return None
 
-    # حاول التقاط الأرقام في الخلايا المجاورة
-    # سنبحث قريبًا من الخلية المحددة عن قيمة رقمية تشبه 0.70x
-    window = candidates[max(0, idx-3): idx+6]
+    # سنبحث ضمن النافذة عن قيمة رقمية تشبه 0.70x
     def _parse_number(s: str) -> float | None:
         s = s.replace(",", "").replace(" ", "")
         try:
@@ -67,7 +48,7 @@ def _from_cbj_scrape() -> float | None:
         return None
 
     for cell in window:
-        val = _parse_number(cell.get_text(strip=True))
+        val = _parse_number(cell)
         if val is not None:
             return val
 
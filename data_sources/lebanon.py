@@ -5,27 +5,14 @@
 # هنا نعرض معدلًا وسطيًا آمنًا للاستخدام التحريري دون أرقام غير مؤكدة المصدر.
 
 from __future__ import annotations
-import requests
-
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (compatible; CurrencyReporter/1.0; +https://example.com)"
-}
+from utils.rate_snapshot import get_usd_rate
 
 def _from_exchangerate_host() -> float | None:
     """
-    مصدر مجاني مستقر:
-    https://api.exchangerate.host/latest?base=USD&symbols=LBP
-    يعيد معدل USD→LBP (قيمة وسطية عامة).
+    معدل USD→LBP الرسمي الوسطي من لقطة exchangerate.host (utils.rate_snapshot)،
+    لا السعر الموازي. None إن لم يتوفر، فتُستخدم القيمة الاحتياطية الثابتة.
     """
-    url = "https://api.exchangerate.host/latest"
-    params = {"base": "USD", "symbols": "LBP"}
-    r = requests.get(url, params=params, headers=HEADERS, timeout=12)
-    if r.status_code == 200:
-        data = r.json()
-        rate = data.get("rates", {}).get("LBP")
-        if isinstance(rate, (int, float)) and rate > 0:
-            return float(rate)
-    return None
+    return get_usd_rate("LBP")
 
 
 def get_rate():
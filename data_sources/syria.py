@@ -4,27 +4,14 @@
 # ملاحظة: السوق السورية تعتمد على أسعار موازية متقلبة؛ هنا نعرض معدلًا وسطيًا آمنًا للتحرير.
 
 from __future__ import annotations
-import requests
-
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (compatible; CurrencyReporter/1.0; +https://example.com)"
-}
+from utils.rate_snapshot import get_usd_rate
 
 def _from_exchangerate_host() -> float | None:
     """
-    مصدر مجاني مستقر:
-    https://api.exchangerate.host/latest?base=USD&symbols=SYP
-    يعيد معدل USD→SYP (قيمة وسطية عامة).
+    معدل USD→SYP الوسطي من لقطة exchangerate.host (utils.rate_snapshot)؛
+    None إن لم يتوفر، فتُستخدم القيمة الاحتياطية الثابتة.
     """
-    url = "https://api.exchangerate.host/latest"
-    params = {"base": "USD", "symbols": "SYP"}
-    r = requests.get(url, params=params, headers=HEADERS, timeout=12)
-    if r.status_code == 200:
-        data = r.json()
-        rate = data.get("rates", {}).get("SYP")
-        if isinstance(rate, (int, float)) and rate > 0:
-            return float(rate)
-    return None
+    return get_usd_rate("SYP")
 
 
 def get_rate():
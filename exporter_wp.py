@@ -1,7 +1,181 @@
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+import hashlib
 import json, os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from utils import publish_ledger as ledger, tracing
+from utils.log_tail import LEDGER_MARKER
+from utils.outbox import Outbox, OutboxWorker
+
+
+class SlugLookupError(Exception):
+    """
+    البحث عن الـ slug لم يُرجع 200 بقائمة (5xx، 429، خطأ مصادقة...): وجود المقال مجهول،
+    فلا يجوز الإنشاء وإلا نتج مقال مكرر بـ slug "-2".
+    """
+
+    def __init__(self, status_code, text=""):
+        super().__init__(f"slug lookup failed [{status_code}]: {text[:200]}")
+        self.status_code = status_code
+
+
+class WordPressPublisher:
+    """
+    ناشر ووردبريس بجلسة اتصالات مجمّعة وإعدادات مخزّنة (يعاد تحميلها فقط إذا تغيّر الملف).
+    النشر idempotent حسب الـ slug:
+      - لا يوجد مقال بنفس الـ slug → إنشاء (POST).
+      - موجود بمحتوى مختلف (hash) → تحديث (PUT) دون تغيير حالته التحريرية.
+      - موجود بنفس المحتوى → تخطٍّ دون أي كتابة.
+    """
+
+    def __init__(self, config_path="config/config.json", pool_maxsize=8):
+        self.config_path = config_path
+        self._conf = None
+        self._conf_mtime = None
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _config(self):
+        mtime = os.path.getmtime(self.config_path)
+        with self._lock:
+            if self._conf is None or mtime != self._conf_mtime:
+                with open(self.config_path, encoding="utf-8") as f:
+                    self._conf = json.load(f)["wordpress"]
+                self._conf_mtime = mtime
+                self.session.auth = HTTPBasicAuth(self._conf["user"], self._conf["app_password"])
+            return self._conf
+
+    @staticmethod
+    def content_hash(title, content, excerpt):
+        raw = json.dumps([title or "", content or "", excerpt or ""], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _find_by_slug(self, wp_url, slug):
+        resp = self.session.get(
+            wp_url,
+            params={"slug": slug, "context": "edit", "status": "publish,draft,pending,future,private"},
+            timeout=30,
+        )
+        if resp.status_code != 200:
+            raise SlugLookupError(resp.status_code, resp.text)
+        try:
+            posts = resp.json()
+        except ValueError:
+            raise SlugLookupError(resp.status_code, resp.text)
+        if not isinstance(posts, list):
+            raise SlugLookupError(resp.status_code, resp.text)
+        return posts[0] if posts else None  # قائمة فارغة فقط تعني "غير موجود"
+
+    def publish(self, article_html, country_code, meta):
+        """
+        يعيد {"action": created|updated|skipped|failed, "post_id": ..., "http_status": ...}
+        """
+        with tracing.span("publish", country_code):
+            result = self._publish(article_html, country_code, meta)
+            # فشل النشر خطأ في مقاييس المراحل (outcome="error")؛ الإجراء يبقى في attrs
+            outcome = "error" if result["action"] == "failed" else result["action"]
+            tracing.set_outcome(outcome, action=result["action"], http_status=result["http_status"])
+            return result
+
+    def _publish(self, article_html, country_code, meta):
+        conf = self._config()
+        wp_url = conf["url"].rstrip("/")                   # مثال: https://example.com/wp-json/wp/v2/posts
+        categories = conf["categories"]                    # {"jordan": 12, ...}
+        status = conf.get("publish_status", "publish")     # "draft" أثناء الاختبار
+
+        # تحضير الحمولة
+        payload = {
+            "title": meta["title"],
+            "content": article_html + meta.get("schema", ""),
+            "status": status,
+            "slug": meta["slug"],
+            "categories": [categories.get(country_code, 0)],
+            "excerpt": meta.get("desc", "")
+        }
+        new_hash = self.content_hash(payload["title"], payload["content"], payload["excerpt"])
+        started = time.perf_counter()
+
+        def _done(action, post_id, http_status, log_result, error=None):
+            _log_publish(country_code, log_result)
+            ledger.record(country_code, action, slug=payload["slug"], post_id=post_id,
+                          http_status=http_status, latency_ms=(time.perf_counter() - started) * 1000.0,
+                          content_hash=new_hash, error=error)
+            return {"action": action, "post_id": post_id, "http_status": http_status}
+
+        try:
+            existing = self._find_by_slug(wp_url, payload["slug"])
+            if existing:
+                post_id = existing.get("id")
+                old_hash = self.content_hash(
+                    (existing.get("title") or {}).get("raw"),
+                    (existing.get("content") or {}).get("raw"),
+                    (existing.get("excerpt") or {}).get("raw"),
+                )
+                if old_hash == new_hash:
+                    print(f"⏭️ Unchanged, skipped: Post ID {post_id}")
+                    return _done("skipped", post_id, 200, f"skipped_{post_id}")
+                update = {k: v for k, v in payload.items() if k != "status"}  # لا نغيّر الحالة التحريرية
+                resp = self.session.put(f"{wp_url}/{post_id}", json=update, timeout=30)
+                action, ok_status = "updated", 200
+            else:
+                resp = self.session.post(wp_url, json=payload, timeout=30)
+                action, ok_status = "created", 201
+        except SlugLookupError as e:
+            print(f"❌ WP {e}")
+            return _done("failed", None, e.status_code, f"failed_lookup_{e.status_code}", error=str(e))
+        except requests.RequestException as e:
+            print(f"❌ WP request error: {e}")
+            return _done("failed", None, None, "failed_request", error=str(e))
+
+        # التحقق من النتيجة
+        if resp.status_code == ok_status:
+            try:
+                post_id = resp.json().get("id")
+            except Exception:
+                post_id = "unknown"
+            if action == "created":
+                print(f"✅ Published: Post ID {post_id}")
+                return _done(action, post_id, resp.status_code, post_id)
+            print(f"🔁 Updated: Post ID {post_id}")
+            return _done(action, post_id, resp.status_code, f"updated_{post_id}")
+
+        print(f"❌ WP publish failed [{resp.status_code}]: {resp.text}")
+        return _done("failed", None, resp.status_code, f"failed_{resp.status_code}", error=resp.text[:500])
+
+    def publish_many(self, items, max_workers=4):
+        """
+        ينشر عدة مقالات بالتوازي بعدد عمّال محدود.
+        items: [{"html": ..., "country_code": ..., "meta": {...}}, ...]
+        يعيد النتائج بنفس ترتيب items.
+        """
+        def _one(item):
+            try:
+                return self.publish(item["html"], item["country_code"], item["meta"])
+            except Exception as e:
+                print(f"❌ WP publish error for {item.get('country_code')}: {e}")
+                return {"action": "failed", "post_id": None, "http_status": None}
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="wp-publish") as pool:
+            return list(pool.map(_one, items))
+
+
+_publishers = {}
+_publishers_lock = threading.Lock()
+
+def get_publisher(config_path="config/config.json"):
+    with _publishers_lock:
+        pub = _publishers.get(config_path)
+        if pub is None:
+            pub = _publishers[config_path] = WordPressPublisher(config_path)
+        return pub
+
 
 def publish_to_wordpress(article_html, country_code, meta, config_path="config/config.json"):
     """
@@ -10,58 +184,91 @@ def publish_to_wordpress(article_html, country_code, meta, config_path="config/c
       - config/config.json: يحتوي عنوان الـ API، المستخدم، كلمة مرور التطبيق، التصنيفات، وضع النشر.
       - meta: dict يحتوي title/desc/slug/schema
     يضيف schema JSON-LD أسفل المحتوى ويُرسل الوصف كـ excerpt (متوافق غالباً مع Yoast/RankMath كبديل آمن).
+    إعادة التشغيل لنفس الـ slug تحدّث المقال الموجود (أو تتخطاه إن لم يتغير) بدل إنشاء مكرر.
     """
-    # تحميل الإعدادات
-    with open(config_path, encoding="utf-8") as f:
-        conf = json.load(f)
-
-    wp_url = conf["wordpress"]["url"]                     # مثال: https://example.com/wp-json/wp/v2/posts
-    user = conf["wordpress"]["user"]                      # مستخدم ووردبريس (يفضل صلاحية Editor)
-    app_password = conf["wordpress"]["app_password"]      # Application Password من لوحة ووردبريس
-    categories = conf["wordpress"]["categories"]          # {"jordan": 12, ...}
-    status = conf["wordpress"].get("publish_status", "publish")  # "draft" أثناء الاختبار
-
-    # تحضير الحمولة
-    payload = {
-        "title": meta["title"],
-        "content": article_html + meta.get("schema", ""),
-        "status": status,
-        "slug": meta["slug"],
-        "categories": [categories.get(country_code, 0)],
-        "excerpt": meta.get("desc", "")
-    }
-
-    # إرسال الطلب
-    try:
-        resp = requests.post(
-            wp_url,
-            auth=HTTPBasicAuth(user, app_password),
-            json=payload,
-            timeout=30
-        )
-    except requests.RequestException as e:
-        print(f"❌ WP request error: {e}")
-        _log_publish(country_code, "failed_request")
-        return
+    return get_publisher(config_path).publish(article_html, country_code, meta)
 
-    # التحقق من النتيجة
-    if resp.status_code == 201:
-        try:
-            post_id = resp.json().get("id")
-        except Exception:
-            post_id = "unknown"
-        print(f"✅ Published: Post ID {post_id}")
-        _log_publish(country_code, post_id)
-    else:
-        print(f"❌ WP publish failed [{resp.status_code}]: {resp.text}")
-        _log_publish(country_code, f"failed_{resp.status_code}")
+
+# ===== صندوق الصادر: النشر غير المتزامن والمقاوم لتعطّل ووردبريس =====
+# التوليد يكتب الحمولة إلى data/outbox/ ويكمل فورًا؛ العامل الخلفي ينشرها ويحذفها
+# عند النجاح (created/updated/skipped) ويعيد جدولة الإخفاق بـ backoff، فتعطّل
+# ووردبريس لا يُفقد مقالًا ولا يستدعي إعادة توليده بالنموذج.
+
+_outbox = None
+_worker = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox(conf=None):
+    """
+    conf = config["outbox"]: {"dir": "data/outbox", "max_attempts": 20, "base_delay": 30, "max_delay": 3600}
+    """
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None or conf is not None:
+            conf = conf or {}
+            _outbox = Outbox(
+                conf.get("dir", "data/outbox"),
+                max_attempts=conf.get("max_attempts", 20),
+                base_delay=conf.get("base_delay", 30),
+                max_delay=conf.get("max_delay", 3600),
+            )
+        return _outbox
+
+
+def enqueue_publish(article_html, country_code, meta):
+    """
+    يحفظ الحمولة على القرص (مفتاحها الـ slug) ليُنشرها العامل؛ إعادة التوليد لنفس اليوم تستبدلها.
+    """
+    return get_outbox().enqueue(meta["slug"], {"html": article_html, "country_code": country_code, "meta": meta})
+
+
+def _publish_outbox_items(items, config_path, max_workers):
+    results = get_publisher(config_path).publish_many([it["payload"] for it in items], max_workers=max_workers)
+    out = []
+    for r in results:
+        if r["action"] == "failed":
+            out.append((False, f"http_{r['http_status']}" if r["http_status"] else "request_error"))
+        else:
+            out.append((True, None))
+    return out
+
+
+def start_outbox_worker(config_path="config/config.json", max_workers=2, interval=5.0):
+    """
+    يشغّل (مرة واحدة لكل عملية) خيطًا خلفيًا يعيد إرسال العناصر المستحقة، بما فيها
+    المتبقي من تشغيلات سابقة.
+    """
+    global _worker
+    outbox = get_outbox()
+    with _outbox_lock:
+        if _worker is None or _worker.stopped or not _worker.is_alive():
+            _worker = OutboxWorker(
+                outbox,
+                lambda items: _publish_outbox_items(items, config_path, max_workers),
+                interval=interval,
+            )
+            _worker.start()
+        return _worker
+
+
+def replay_outbox(config_path="config/config.json", max_workers=2, timeout=60.0):
+    """
+    تفريغ متزامن للمستحق (للـ CLI أو نهاية التشغيل)؛ يعيد عدد العناصر التي بقيت معلّقة.
+    """
+    worker = _worker or OutboxWorker(
+        get_outbox(), lambda items: _publish_outbox_items(items, config_path, max_workers)
+    )
+    return worker.drain(timeout)
 
 
 def _log_publish(country_code, result):
     """
-    يسجل عمليات النشر والنتائج في data/logs.txt
+    يسجل عمليات النشر والنتائج في data/logs.txt (مرآة نصية قديمة؛ السجل المنظّم
+    الكامل في utils.publish_ledger). الحقل الأخير "ledger" يعني أن المحاولة مسجّلة
+    في الدفتر أصلًا، فلا يعيد import-logs استيرادها.
     """
     os.makedirs("data", exist_ok=True)
-    line = f"{date.today().isoformat()} | {country_code} | {result}\n"
+    line = f"{date.today().isoformat()} | {country_code} | {result} | {LEDGER_MARKER}\n"
     with open("data/logs.txt", "a", encoding="utf-8") as f:
         f.write(line)
@@ -1,13 +1,24 @@
 # generator.py
-import os, json
+import argparse
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+import os, json, time
 from datetime import date
-from utils.fetch_utils import get_country_rate, save_rate_to_csv
+from utils.fetch_utils import get_country_rate, save_rate_to_csv, configure_rate_cache, maybe_compact_history
 from utils.rate_analyzer import get_rate_change
-from utils.call_llm import call_llm
+from utils.call_llm import call_llm, configure_llm_timeout
 from utils.text_utils import humanize
-from utils.meta_utils import generate_meta
-import markdown
-from exporter_wp import publish_to_wordpress
+from utils.template_engine import render_article, render_meta
+from utils.meta_utils import generate_meta, generate_article_and_meta, build_meta_prompt, meta_from_raw
+from utils.batch_llm import BATCH_DIR, get_backend, make_request, run_batch
+from utils.pipeline import run_pipeline
+from utils.incremental import is_unchanged, load_previous, reuse_previous, save_inputs
+from utils.http_utils import configure_http
+from utils.llm_cache import configure_llm_cache
+from utils.rate_limit import configure_rate_limits
+from utils.circuit_breaker import breaker_states, configure_breakers
+from utils import tracing
+from utils.tracing import span
+from exporter_wp import publish_to_wordpress, enqueue_publish, get_outbox, start_outbox_worker, replay_outbox
 
 def build_prompt(country_ar, tone, focus, intro, rate, change, min_words, max_words, country_code, style=None):
     today_human = date.today().isoformat()
@@ -49,36 +60,130 @@ def build_prompt(country_ar, tone, focus, intro, rate, change, min_words, max_wo
 {caution_eg}
 """
 
-def _generate_payload(country_code, config, prompts):
-    model = config.get("model", "gpt-5")
-    min_w = config.get("content", {}).get("min_words", 140)
-    max_w = config.get("content", {}).get("max_words", 220)
-
-    rate = get_country_rate(country_code)
-    save_rate_to_csv(rate)
-    change = get_rate_change("data/rates_history.csv", rate["country"])
+def _fetch_stage(country_code, force_refresh=False):
+    """
+    مرحلة الجلب: سعر الدولة + حفظه في السجل + حساب التغير مقارنة بالأمس.
+    force_refresh=True يتجاوز كاش الأسعار (التشغيل الليلي يريد أحدث قيمة).
+    """
+    with span("fetch", country_code):
+        rate = get_country_rate(country_code, force_refresh=force_refresh)
+    with span("history_write", country_code):
+        save_rate_to_csv(rate)
+    with span("rate_change", country_code):
+        change = get_rate_change("data/rates_history.csv", rate["country"])
+    return {"country_code": country_code, "rate": rate, "change": change}
 
+def _article_prompt(fetched, config, prompts):
+    country_code = fetched["country_code"]
+    rate = fetched["rate"]
     p = prompts[country_code]
-    style = p.get("style")
-    prompt = build_prompt(
+    return build_prompt(
         country_ar=rate["country"],
         tone=p.get("tone", ""),
         focus=p.get("focus", ""),
         intro=p.get("intro", ""),
         rate=rate,
-        change=change,
-        min_words=min_w,
-        max_words=max_w,
+        change=fetched["change"],
+        min_words=config.get("content", {}).get("min_words", 140),
+        max_words=config.get("content", {}).get("max_words", 220),
         country_code=country_code,
-        style=style
+        style=p.get("style")
     )
 
-    article_md = call_llm(prompt, model=model, temperature=0.8)
-    article_md = humanize(article_md, min_words=min_w, max_words=max_w)
-    article_html = markdown.markdown(article_md)
+def _check_deadline(deadline_at, cc):
+    if deadline_at is not None and time.monotonic() >= deadline_at:
+        raise FuturesTimeout(f"LLM deadline passed for {cc}; result would be discarded")
+
+def _llm_generate(fetched, config, prompts, on_text=None, deadline_at=None):
+    """
+    استدعاءات النموذج فقط: يعيد (article_md, title, desc) دون كتابة أي ملف.
+    مع config["generation"]["combined_meta"] يُطلب المقال والميتا في طلب منظّم واحد.
+    on_text: بث نص المقال أثناء توليده (يُستخدم المسار المنفصل لأن الرد المدمج JSON).
+    deadline_at (time.monotonic): بعد تجاوزه لا يُرسل طلب جديد لأن المستدعي انتقل إلى القالب.
+    """
+    cc = fetched["country_code"]
+    rate = fetched["rate"]
+    model = config.get("model", "gpt-5")
+    today = date.today().isoformat()
+    prompt = _article_prompt(fetched, config, prompts)
+    _check_deadline(deadline_at, cc)
+
+    if config.get("generation", {}).get("combined_meta") and on_text is None:
+        with span("call_llm", cc) as s:
+            if s is not None:
+                s.attrs["combined_meta"] = True
+            return generate_article_and_meta(
+                prompt, rate["country"], today, rate["currency"], rate["buy"], rate["sell"], model, temperature=0.8
+            )
+    with span("call_llm", cc):
+        article_md = call_llm(prompt, model=model, temperature=0.8, on_text=on_text)
+    _check_deadline(deadline_at, cc)
+    with span("generate_meta", cc):
+        title, desc = generate_meta(rate["country"], today, rate["currency"], rate["buy"], rate["sell"], model)
+    return article_md, title, desc
+
+def _template_generate(fetched, prompts):
+    rate = fetched["rate"]
+    with span("template", fetched["country_code"]):
+        article_md = render_article(rate, fetched["change"], fetched["country_code"], prompts.get(fetched["country_code"]))
+        title, desc = render_meta(rate)
+    return article_md, title, desc
+
+# مجمّع مستقل لاستدعاءات النموذج ذات المهلة: الاستدعاء المتأخر يكمل فيه ويُهمَل ناتجه
+# دون أن يحجز عامل مرحلة llm في خط التشغيل
+_deadline_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-deadline")
+
+def _llm_stage(fetched, config, prompts, on_text=None):
+    """
+    مرحلة التوليد ثم البشرنة والحفظ. config["generation"]:
+      - mode="template": محرك القوالب دون أي استدعاء للنموذج.
+      - llm_deadline (ثوانٍ): إذا تأخر النموذج أو فشل بعد كل بدائله يُستخدم القالب.
+    البث (on_text) يبقى في خيط المستدعي دون مهلة لأن واجهة Streamlit مرتبطة به.
+    """
+    gen = config.get("generation", {})
+    if gen.get("mode") == "template":
+        return _finalize_payload(fetched, *_template_generate(fetched, prompts), config, generator="template")
+
+    deadline = gen.get("llm_deadline")
+    if not deadline or on_text is not None:
+        return _finalize_payload(fetched, *_llm_generate(fetched, config, prompts, on_text), config)
+
+    # wrap: spans الاستدعاء في خيط المهلة ترث سياق المستدعي (الدولة والـ span الأب)
+    deadline_at = time.monotonic() + deadline
+    fut = _deadline_pool.submit(tracing.wrap(_llm_generate), fetched, config, prompts, on_text, deadline_at)
+    generator = "llm"
+    try:
+        article_md, title, desc = fut.result(timeout=deadline)
+    except FuturesTimeout:
+        fut.cancel()  # لم يبدأ بعد (ينتظر خلف استدعاءات متأخرة)؟ لا يُرسل أصلًا
+        print(f"⏱️ LLM deadline ({deadline}s) exceeded for {fetched['country_code']}, using template.")
+        article_md, title, desc = _template_generate(fetched, prompts)
+        generator = "template"
+    except Exception as e:
+        print(f"⚠️ LLM failed for {fetched['country_code']} ({e}), using template.")
+        article_md, title, desc = _template_generate(fetched, prompts)
+        generator = "template"
+    return _finalize_payload(fetched, article_md, title, desc, config, generator=generator)
+
+def _finalize_payload(fetched, article_md, title, desc, config, humanized=False, base=None, generator="llm"):
+    """
+    بعد النموذج: البشرنة، التحويل إلى HTML، schema، وحفظ نسخة Markdown مع مدخلاتها.
+    humanized=True لنص سبقت بشرنته (مقال مُعاد استخدامه)؛ base و generator يُمرَّران
+    لملف المدخلات (مقال القوالب لا يُعاد استخدامه في التشغيل التزايدي التالي).
+    """
+    country_code = fetched["country_code"]
+    rate = fetched["rate"]
+    min_w = config.get("content", {}).get("min_words", 140)
+    max_w = config.get("content", {}).get("max_words", 220)
+
+    if not humanized:
+        with span("humanize", country_code):
+            article_md = humanize(article_md, min_words=min_w, max_words=max_w, key=country_code)
+    with span("markdown", country_code):
+        import markdown  # تحميل كسول: لا نحتاجه إلا عند التحويل إلى HTML
+        article_html = markdown.markdown(article_md)
 
     today = date.today().isoformat()
-    title, desc = generate_meta(rate["country"], today, rate["currency"], rate["buy"], rate["sell"], model)
     schema = f"""
 <script type="application/ld+json">{{
   "@context": "https://schema.org",
@@ -94,23 +199,55 @@ def _generate_payload(country_code, config, prompts):
     md_path = f"data/articles/{today}-{country_code}.md"
     with open(md_path, "w", encoding="utf-8") as f:
         f.write(article_md)
+    save_inputs(md_path, fetched, title, desc, today, base=base, generator=generator)
 
     return {
         "country_code": country_code,
         "rate": rate,
-        "change": change,
+        "change": fetched["change"],
         "md_path": md_path,
         "html": article_html,
         "meta": {"title": title, "desc": desc, "slug": f"usd-{country_code}-{today}", "schema": schema}
     }
 
-def generate_one(country_code, preview_only=True):
+def _incremental_stage(fetched, config, prompts):
+    """
+    التوليد التزايدي (config["incremental"]): إذا لم يتحرك السعر أكثر من threshold_pct
+    عن مدخلات آخر مقال ولّده النموذج يُعاد استخدامه بأرقام وتاريخ محدّثين
+    (action="refresh") أو تُتخطى الدولة (action="skip")؛ غير ذلك → النموذج.
+    """
+    inc = config.get("incremental", {})
+    prev = load_previous(fetched["country_code"])
+    if prev is None or not is_unchanged(prev["inputs"], fetched, inc.get("threshold_pct", 0.0)):
+        return _llm_stage(fetched, config, prompts)
+    return _reuse_payload(fetched, prev, config)
+
+def _reuse_payload(fetched, prev, config):
+    cc = fetched["country_code"]
+    if config.get("incremental", {}).get("action", "refresh") == "skip":
+        print(f"⏭️ Rate unchanged for {cc}, skipped.")
+        return {"country_code": cc, "skipped": True}
+    today = date.today().isoformat()
+    with span("reuse", cc):
+        article_md, title, desc = reuse_previous(prev, fetched, today)
+    print(f"♻️ Rate unchanged for {cc}, reused {prev['inputs'].get('date')} article.")
+    return _finalize_payload(fetched, article_md, title, desc, config,
+                             humanized=True, base=prev["inputs"].get("base"))
+
+def _generate_payload(country_code, config, prompts, on_text=None):
+    return _llm_stage(_fetch_stage(country_code), config, prompts, on_text=on_text)
+
+def generate_one(country_code, preview_only=True, on_text=None):
     with open("config/config.json", encoding="utf-8") as f:
         config = json.load(f)
     with open("config/prompts.json", encoding="utf-8") as f:
         prompts = json.load(f)
+    configure_rate_cache(config.get("cache"))
+    configure_llm_cache(config.get("llm_cache"))
+    configure_rate_limits(config.get("rate_limits"))
+    configure_llm_timeout(config.get("generation", {}).get("llm_deadline"))
 
-    payload = _generate_payload(country_code, config, prompts)
+    payload = _generate_payload(country_code, config, prompts, on_text=on_text)
     if not preview_only:
         publish_to_wordpress(payload["html"], country_code, payload["meta"])
     return payload
@@ -124,24 +261,184 @@ def _countries_from_env_or_config(config):
         return [c.strip() for c in selected.split(",") if c.strip()]
     return config["countries"]
 
-def main():
+def _publish_stage(payload, preview_only):
+    """
+    لا ينتظر ووردبريس: يضع الحمولة في صندوق الصادر، والعامل الخلفي ينشرها.
+    """
+    cc = payload["country_code"]
+    if payload.get("skipped"):
+        return payload
+    if preview_only:
+        print(f"👀 Preview generated for {cc}: {payload['md_path']}")
+    else:
+        enqueue_publish(payload["html"], cc, payload["meta"])
+        print(f"📤 Queued for publishing: {cc} ({payload['meta']['slug']})")
+    return payload
+
+def _incremental_enabled(config):
+    return bool(config.get("incremental", {}).get("enabled"))
+
+def _pipeline_stages(config, prompts, preview_only):
+    """
+    مراحل التشغيل الليلي مع حد التزامن لكل مرحلة من config["pipeline"].
+    """
+    workers = config.get("pipeline", {})
+    generate = _incremental_stage if _incremental_enabled(config) else _llm_stage
+    return [
+        ("fetch", lambda cc: _fetch_stage(cc, force_refresh=True), workers.get("fetch_workers", 4)),
+        ("llm", lambda fetched: generate(fetched, config, prompts), workers.get("llm_workers", 3)),
+        ("publish", lambda payload: _publish_stage(payload, preview_only), workers.get("publish_workers", 2)),
+    ]
+
+def _report(cc, entry):
+    if entry["error"] is not None:
+        print(f"❌ Failed for {cc} [{entry['stage']}]: {entry['error']}")
+
+def _report_breakers():
+    """
+    يطبع حالة قواطع الدائرة غير المغلقة في نهاية التشغيل (نموذج تعطّل وتحوّل للبديل).
+    """
+    for model, st in breaker_states().items():
+        if st["state"] != "closed":
+            print(f"🔌 Circuit {st['state']} for {model} (failures={st['failures']})")
+
+def _run_batch_mode(config, prompts, countries, preview_only, backend_name="openai"):
+    """
+    وضع الدُفعات: جلب كل الدول، ثم برومبتات المقالات والميتا في مهمة Batch واحدة،
+    ثم humanize/HTML/نشر على النتائج. لا متطلبات زمنية، لكن بتكلفة أقل ودون حدود RPM.
+    """
+    workers = config.get("pipeline", {})
+    model = config.get("model", "gpt-5")
+    today = date.today().isoformat()
+
+    fetched = run_pipeline(
+        countries,
+        [("fetch", lambda cc: _fetch_stage(cc, force_refresh=True), workers.get("fetch_workers", 4))],
+        on_done=_report,
+    )
+    ready = {cc: e["result"] for cc, e in fetched.items() if e["error"] is None}
+
+    reused = {}
+    if _incremental_enabled(config):
+        threshold = config["incremental"].get("threshold_pct", 0.0)
+        for cc, f in list(ready.items()):
+            prev = load_previous(cc)
+            if prev is not None and is_unchanged(prev["inputs"], f, threshold):
+                reused[cc] = (ready.pop(cc), prev)
+    if reused:
+        run_pipeline(
+            list(reused),
+            [
+                ("reuse", lambda cc: _reuse_payload(*reused[cc], config), workers.get("llm_workers", 3)),
+                ("publish", lambda payload: _publish_stage(payload, preview_only), workers.get("publish_workers", 2)),
+            ],
+            on_done=_report,
+        )
+
+    reqs = []
+    for cc, f in ready.items():
+        rate = f["rate"]
+        reqs.append(make_request(f"{cc}:article", _article_prompt(f, config, prompts), model, 0.8))
+        reqs.append(make_request(f"{cc}:meta", build_meta_prompt(rate["country"], today, rate["buy"], rate["sell"]), model, 0.6))
+    if not reqs:
+        return
+
+    batch_conf = config.get("batch", {})
+    try:
+        results = run_batch(
+            reqs,
+            backend=get_backend(backend_name),
+            job_path=os.path.join(BATCH_DIR, f"{today}-{int(time.time())}.jsonl"),
+            poll_interval=batch_conf.get("poll_interval", 30),
+            timeout=batch_conf.get("timeout_hours", 24) * 3600,
+        )
+    except Exception as e:
+        # فشل المهمة أو انتهاء مهلتها لا يُسقط التشغيل: كل الدول تُولَّد بالقوالب أدناه
+        print(f"⚠️ Batch job failed ({e}); falling back to templates for {len(ready)} countries.")
+        results = {}
+
+    def _finalize(cc):
+        f = ready[cc]
+        rate = f["rate"]
+        article_md = results.get(f"{cc}:article")
+        if not article_md:
+            print(f"⚠️ No batch result for {cc}, using template.")
+            return _finalize_payload(f, *_template_generate(f, prompts), config, generator="template")
+        title, desc = meta_from_raw(results.get(f"{cc}:meta"), rate["country"], today, rate["currency"])
+        return _finalize_payload(f, article_md, title, desc, config)
+
+    run_pipeline(
+        list(ready),
+        [
+            ("render", _finalize, workers.get("llm_workers", 3)),
+            ("publish", lambda payload: _publish_stage(payload, preview_only), workers.get("publish_workers", 2)),
+        ],
+        on_done=_report,
+    )
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Currency Reporter – nightly generator")
+    ap.add_argument("--batch", action="store_true", help="إرسال كل البرومبتات كمهمة Batch API واحدة")
+    ap.add_argument("--batch-backend", default="openai", choices=("openai", "local"),
+                    help="local = بديل محلي للاختبار دون شبكة")
+    ap.add_argument("--mode", choices=("llm", "template"),
+                    help="template = توليد بالقوالب دون نموذج لغوي (يتجاوز generation.mode)")
+    ap.add_argument("--full", action="store_true",
+                    help="تجاهل التوليد التزايدي وإعادة توليد كل المقالات بالنموذج")
+    ap.add_argument("--replay-outbox", action="store_true",
+                    help="إعادة إرسال المقالات المعلّقة في صندوق الصادر فقط دون توليد")
+    args = ap.parse_args(argv)
+
     with open("config/config.json", encoding="utf-8") as f:
         config = json.load(f)
     with open("config/prompts.json", encoding="utf-8") as f:
         prompts = json.load(f)
 
+    configure_rate_cache(config.get("cache"))
+    configure_http(**config.get("http", {}))
+    configure_llm_cache(config.get("llm_cache"))
+    configure_rate_limits(config.get("rate_limits"))
+    configure_llm_timeout(config.get("generation", {}).get("llm_deadline"))
+    configure_breakers(**config.get("circuit_breaker", {}))
+    tracing.configure(config.get("tracing"))
+    outbox_conf = config.get("outbox", {})
+    get_outbox(outbox_conf)
+    publish_workers = config.get("pipeline", {}).get("publish_workers", 2)
+    drain_timeout = outbox_conf.get("drain_timeout", 120)
+
+    if args.replay_outbox:
+        left = replay_outbox(max_workers=publish_workers, timeout=drain_timeout)
+        print(f"📬 Outbox pending: {left}")
+        return
+
+    if args.mode:
+        config.setdefault("generation", {})["mode"] = args.mode
+    if args.full:
+        config.setdefault("incremental", {})["enabled"] = False
     preview_only = os.getenv("PREVIEW_ONLY", "false").lower() in ("1","true","yes")
     countries = _countries_from_env_or_config(config)
 
-    for cc in countries:
-        try:
-            payload = _generate_payload(cc, config, prompts)
-            if preview_only:
-                print(f"👀 Preview generated for {cc}: {payload['md_path']}")
-            else:
-                publish_to_wordpress(payload["html"], cc, payload["meta"])
-        except Exception as e:
-            print(f"❌ Failed for {cc}: {e}")
+    # العامل يبدأ بالمعلّق من التشغيلات السابقة وينشر الجديد أثناء توليد بقية الدول
+    worker = None if preview_only else start_outbox_worker(
+        max_workers=publish_workers, interval=outbox_conf.get("poll_interval", 5)
+    )
+    try:
+        if args.batch and config.get("generation", {}).get("mode") != "template":
+            _run_batch_mode(config, prompts, countries, preview_only, args.batch_backend)
+        else:
+            run_pipeline(countries, _pipeline_stages(config, prompts, preview_only), on_done=_report)
+        maybe_compact_history(every_days=config.get("history", {}).get("compact_every_days", 7))
+    finally:
+        # حتى عند استثناء غير متوقع: تفريغ صندوق الصادر وتصدير الـ traces لا يُفقدان
+        if worker is not None:
+            left = worker.drain(drain_timeout)
+            worker.stop()
+            if left:
+                print(f"📬 {left} article(s) still pending in outbox; will retry on next run.")
+        _report_breakers()
+        trace_path = tracing.export()
+        if trace_path:
+            print(f"⏱️ Stage timings: {trace_path} (python -m utils.tracing summary)")
 
 if __name__ == "__main__":
     main()
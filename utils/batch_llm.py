@@ -0,0 +1,180 @@
+# utils/batch_llm.py
+# وضع الدُفعات (Batch API) للتشغيل الليلي: كل برومبتات التشغيل في ملف JSONL واحد،
+# يُرسل كمهمة واحدة، ثم نستطلع حالتها ونقرأ النتائج. أرخص ولا يستهلك حدود RPM التفاعلية.
+# يتضمن LocalBatchBackend بديلًا محليًا للاختبار دون شبكة.
+
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+BATCH_DIR = os.path.join("data", "batches")
+ENDPOINT = "/v1/responses"
+
+# حالات المهمة النهائية كما يعيدها OpenAI
+_TERMINAL = ("completed", "failed", "expired", "cancelled")
+
+
+def make_request(custom_id: str, prompt: str, model: str, temperature: float) -> Dict[str, Any]:
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": ENDPOINT,
+        "body": {"model": model, "input": prompt, "temperature": temperature},
+    }
+
+
+def write_batch_file(requests_: List[Dict[str, Any]], path: str) -> str:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for r in requests_:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    return path
+
+
+def _output_text(body: Dict[str, Any]) -> str:
+    """
+    يستخرج النص من جسم رد Responses API (ما يعادل resp.output_text).
+    """
+    if isinstance(body.get("output_text"), str):
+        return body["output_text"]
+    parts = []
+    for item in body.get("output", []) or []:
+        if item.get("type") != "message":
+            continue
+        for c in item.get("content", []) or []:
+            if c.get("type") == "output_text":
+                parts.append(c.get("text", ""))
+    return "".join(parts)
+
+
+def parse_results(lines) -> Dict[str, str]:
+    """
+    يحوّل أسطر ملف المخرجات إلى {custom_id: text}؛ الطلبات الفاشلة لا تظهر في الناتج.
+    """
+    out: Dict[str, str] = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        rec = json.loads(line)
+        resp = rec.get("response") or {}
+        if rec.get("error") or resp.get("status_code") != 200:
+            continue
+        out[rec["custom_id"]] = _output_text(resp.get("body") or {})
+    return out
+
+
+class OpenAIBatchBackend:
+    """
+    Batch API الفعلي: رفع الملف (purpose=batch) → إنشاء مهمة → استطلاع → تنزيل المخرجات.
+    """
+
+    def __init__(self, completion_window: str = "24h"):
+        self.completion_window = completion_window
+
+    def _client(self):
+        from .call_llm import _client_singleton
+        return _client_singleton()
+
+    def submit(self, path: str) -> str:
+        client = self._client()
+        with open(path, "rb") as f:
+            uploaded = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=ENDPOINT,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self._client().batches.retrieve(batch_id).status
+
+    def results(self, batch_id: str) -> Dict[str, str]:
+        client = self._client()
+        batch = client.batches.retrieve(batch_id)
+        if not batch.output_file_id:
+            return {}
+        content = client.files.content(batch.output_file_id).text
+        return parse_results(content.splitlines())
+
+
+class LocalBatchBackend:
+    """
+    بديل محلي للاختبار: يعالج ملف الدفعة فورًا عبر responder(body) -> text
+    ويكتب ملف مخرجات بنفس صيغة OpenAI بجانب ملف الإدخال.
+    """
+
+    def __init__(self, responder: Optional[Callable[[Dict[str, Any]], str]] = None):
+        self.responder = responder or _default_responder
+        self._outputs: Dict[str, str] = {}
+
+    def submit(self, path: str) -> str:
+        out_path = path + ".out"
+        with open(path, encoding="utf-8") as fin, open(out_path, "w", encoding="utf-8") as fout:
+            for line in fin:
+                if not line.strip():
+                    continue
+                req = json.loads(line)
+                try:
+                    text = self.responder(req["body"])
+                    rec = {"custom_id": req["custom_id"], "error": None,
+                           "response": {"status_code": 200, "body": {"output_text": text}}}
+                except Exception as e:
+                    rec = {"custom_id": req["custom_id"], "error": {"message": str(e)}, "response": None}
+                fout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        batch_id = f"local-{os.path.basename(path)}"
+        self._outputs[batch_id] = out_path
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        return "completed" if batch_id in self._outputs else "failed"
+
+    def results(self, batch_id: str) -> Dict[str, str]:
+        with open(self._outputs[batch_id], encoding="utf-8") as f:
+            return parse_results(f)
+
+
+def _default_responder(body: Dict[str, Any]) -> str:
+    prompt = body.get("input", "")
+    if "JSON" in prompt:
+        return json.dumps({"titles": ["سعر الدولار اليوم"], "descriptions": ["آخر تحديث لسعر الدولار."]},
+                          ensure_ascii=False)
+    return "استقر سعر الدولار اليوم وفق البيانات الرسمية.\n\nفي المقابل، يترقب المتعاملون قرارات السياسة النقدية."
+
+
+def get_backend(name: str = "openai"):
+    if name == "local":
+        return LocalBatchBackend()
+    if name == "openai":
+        return OpenAIBatchBackend()
+    raise ValueError(f"Batch backend غير معروف: {name}")
+
+
+def run_batch(requests_: List[Dict[str, Any]],
+              backend=None,
+              job_path: Optional[str] = None,
+              poll_interval: float = 30.0,
+              timeout: float = 24 * 3600) -> Dict[str, str]:
+    """
+    يكتب ملف الدفعة، يرسله، يستطلع حتى حالة نهائية، ويعيد {custom_id: text}.
+    """
+    backend = backend or OpenAIBatchBackend()
+    if job_path is None:
+        job_path = os.path.join(BATCH_DIR, f"batch-{int(time.time())}.jsonl")
+    write_batch_file(requests_, job_path)
+    batch_id = backend.submit(job_path)
+    print(f"📦 Batch submitted: {batch_id} ({len(requests_)} requests)")
+
+    deadline = time.time() + timeout
+    status = backend.status(batch_id)
+    while status not in _TERMINAL:
+        if time.time() > deadline:
+            raise TimeoutError(f"Batch {batch_id} لم يكتمل خلال المهلة (آخر حالة: {status}).")
+        time.sleep(poll_interval)
+        status = backend.status(batch_id)
+
+    if status != "completed":
+        raise RuntimeError(f"Batch {batch_id} انتهى بحالة {status}.")
+    return backend.results(batch_id)
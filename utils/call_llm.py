@@ -1,61 +1,223 @@
 # utils/call_llm.py
-# دالة اتصال آمنة بـ OpenAI مع إعادة المحاولة + خيار fallback
+# دالة اتصال آمنة بـ OpenAI مع إعادة محاولة مصنّفة حسب نوع الخطأ (مع Retry-After)
+# + قاطع دائرة لكل نموذج + خيار fallback + كاش ردود اختياري
 
 import os
 import time
 import random
-from typing import Optional
-from openai import OpenAI
+import threading
+from typing import Any, Callable, Dict, Optional, TYPE_CHECKING
 
-_client: Optional[OpenAI] = None
+from . import llm_cache, rate_limit, tracing
+from .circuit_breaker import get_breaker
 
+if TYPE_CHECKING:
+    from openai import OpenAI
 
-def _client_singleton() -> OpenAI:
+# openai يُحمَّل عند أول استدعاء فقط (يكلف مئات الميلي ثانية عند الإقلاع)
+_client: Optional["OpenAI"] = None
+_client_lock = threading.Lock()
+REQUEST_TIMEOUT: Optional[float] = None  # مهلة كل طلب HTTP بالثواني؛ None = افتراضي openai (600)
+
+
+def _client_singleton() -> "OpenAI":
     global _client
-    if _client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise RuntimeError("OPENAI_API_KEY غير مضبوط في متغيرات البيئة.")
-        _client = OpenAI(api_key=api_key)
+    with _client_lock:
+        if _client is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise RuntimeError("OPENAI_API_KEY غير مضبوط في متغيرات البيئة.")
+            from openai import OpenAI
+            # max_retries=0: إعادة المحاولة وتصنيف الأخطاء تتم هنا لا داخل مكتبة openai
+            kwargs = {"timeout": REQUEST_TIMEOUT} if REQUEST_TIMEOUT else {}
+            _client = OpenAI(api_key=api_key, max_retries=0, **kwargs)
     return _client
 
 
+def configure_llm_timeout(seconds: Optional[float]) -> None:
+    """
+    يضبط مهلة طلب النموذج (عادةً = generation.llm_deadline) كي لا يبقى استدعاء تجاوز
+    مهلته محتجزًا في مجمّع الخيوط حتى مهلة openai الافتراضية. يُعاد بناء العميل عند التغيير فقط.
+    """
+    global REQUEST_TIMEOUT, _client
+    value = float(seconds) if seconds else None
+    with _client_lock:
+        if value != REQUEST_TIMEOUT:
+            REQUEST_TIMEOUT = value
+            _client = None
+
+
 def call_llm(prompt: str, model: str = "gpt-5",
              temperature: float = 0.8,
              max_retries: int = 3,
-             fallback_model: Optional[str] = "gpt-4o-mini") -> str:
+             fallback_model: Optional[str] = "gpt-4o-mini",
+             cache: Optional[bool] = None,
+             cache_bypass: bool = False,
+             json_schema: Optional[Dict[str, Any]] = None,
+             on_text: Optional[Callable[[str], None]] = None) -> str:
     """
     يستدعي نموذج OpenAI لإنتاج نص.
     - model: النموذج الأساسي (نوصي gpt-5)
     - fallback_model: نموذج احتياطي في حال فشل الأساس (يمكن تعطيله بوضع None)
     - max_retries: عدد محاولات إعادة الطلب مع backoff أُسّي
+    - cache: استخدام كاش الردود القرصي (None = حسب الإعداد العام utils.llm_cache.ENABLED)
+    - cache_bypass: تجاهل الرد المخزّن وطلب رد جديد (ثم تخزينه)
+    - json_schema: {"name": ..., "schema": {...}} لطلب مخرجات منظّمة (JSON مطابق للمخطط)؛
+      يعيد نص JSON كما هو ويبقى التحليل على المستدعي.
+    - on_text: عند تمريرها يُطلب الرد بالبث (stream) وتُستدعى مع النص المتراكم حتى الآن
+      بعد كل دفعة؛ عند إعادة المحاولة يبدأ التراكم من جديد فيُستبدل المعروض تلقائيًا.
     """
-    client = _client_singleton()
+    use_cache = llm_cache.ENABLED if cache is None else cache
+    if use_cache:
+        key = llm_cache.cache_key(model, prompt, temperature, json_schema=json_schema)
+        if not cache_bypass:
+            hit = llm_cache.get(key)
+            if hit is not None:
+                tracing.set_outcome("cache_hit")
+                if on_text:
+                    on_text(hit)
+                return hit
+        text = _call_uncached(prompt, model, temperature, max_retries, fallback_model, json_schema, on_text)
+        llm_cache.put(key, text, {"model": model, "temperature": temperature})
+        return text
+    return _call_uncached(prompt, model, temperature, max_retries, fallback_model, json_schema, on_text)
+
+
+def _request_kwargs(json_schema: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not json_schema:
+        return {}
+    return {"text": {"format": {
+        "type": "json_schema",
+        "name": json_schema.get("name", "output"),
+        "schema": json_schema["schema"],
+        "strict": json_schema.get("strict", True),
+    }}}
+
+
+def _create(client, model: str, prompt: str, temperature: float,
+            extra: Dict[str, Any], on_text: Optional[Callable[[str], None]]) -> str:
+    # انتظر الدور ضمن حصة RPM/TPM المشتركة قبل الإرسال (كل محاولة طلب مستقل)
+    rate_limit.acquire(model, rate_limit.estimate_tokens(prompt))
+    if on_text is None:
+        resp = client.responses.create(model=model, input=prompt, temperature=temperature, **extra)
+        return resp.output_text
+
+    parts = []
+    stream = client.responses.create(model=model, input=prompt, temperature=temperature, stream=True, **extra)
+    for event in stream:
+        etype = getattr(event, "type", "")
+        if etype == "response.output_text.delta":
+            parts.append(event.delta)
+            on_text("".join(parts))
+        elif etype in ("response.failed", "error"):
+            raise RuntimeError(f"stream error: {getattr(event, 'error', None) or event}")
+    return "".join(parts)
+
+
+# رموز HTTP التي لا تفيد إعادة المحاولة معها
+_FATAL_STATUS = (401, 403)             # مصادقة/صلاحيات: لن ينجح أي نموذج
+_NON_RETRYABLE_STATUS = (400, 404, 422)  # طلب غير صالح لهذا النموذج: جرّب البديل مباشرة
+MAX_RETRY_AFTER = 60.0
+
 
-    last_err = None
-    for attempt in range(max_retries):
+def classify_error(err: Exception) -> str:
+    """
+    يصنّف الخطأ: "fatal" (أوقف فورًا) | "non_retryable" (انتقل للبديل) | "retryable".
+    """
+    status = getattr(err, "status_code", None)
+    code = getattr(err, "code", None)
+    if status in _FATAL_STATUS or code == "insufficient_quota":
+        return "fatal"
+    if status in _NON_RETRYABLE_STATUS:
+        return "non_retryable"
+    return "retryable"  # 408/409/429/5xx وأخطاء الاتصال والمهلة
+
+
+def _retry_after(err: Exception) -> Optional[float]:
+    """
+    يقرأ Retry-After (ثوانٍ أو تاريخ HTTP) أو retry-after-ms من رد 429/503 إن وُجد.
+    """
+    resp = getattr(err, "response", None)
+    headers = getattr(resp, "headers", None)
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
         try:
-            resp = client.responses.create(
-                model=model,
-                input=prompt,
-                temperature=temperature,
-            )
-            return resp.output_text
-        except Exception as e:
-            last_err = e
-            sleep_for = (2 ** attempt) + random.uniform(0, 0.6)
-            time.sleep(sleep_for)
-
-    # فشل النموذج الأساسي بعد المحاولات -> جرّب fallback إذا موجود
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_delay(err: Exception, attempt: int) -> float:
+    hinted = _retry_after(err)
+    if hinted is not None:
+        return min(hinted, MAX_RETRY_AFTER)
+    return (2 ** attempt) + random.uniform(0, 0.6)
+
+
+def _call_uncached(prompt: str, model: str, temperature: float,
+                   max_retries: int, fallback_model: Optional[str],
+                   json_schema: Optional[Dict[str, Any]] = None,
+                   on_text: Optional[Callable[[str], None]] = None) -> str:
+    client = _client_singleton()
+    extra = _request_kwargs(json_schema)
+
+    last_err: Optional[Exception] = None
+    breaker = get_breaker(model)
+    if breaker.allow():
+        for attempt in range(max_retries):
+            try:
+                text = _create(client, model, prompt, temperature, extra, on_text)
+                breaker.record_success()
+                return text
+            except Exception as e:
+                last_err = e
+                kind = classify_error(e)
+                if kind != "retryable":
+                    breaker.release()  # خطأ في الطلب لا في الخدمة: حرّر المحاولة التجريبية دون حكم
+                if kind == "fatal":
+                    raise RuntimeError(f"LLM call failed (non-retryable). Last error: {e}") from e
+                if kind == "non_retryable":
+                    break
+                breaker.record_failure()
+                if attempt + 1 >= max_retries or not breaker.allow():
+                    break  # لا نوم بعد آخر محاولة، ولا إعادة إذا فُتح القاطع
+                tracing.note_retry()
+                time.sleep(_retry_delay(e, attempt))
+    else:
+        last_err = RuntimeError(f"circuit open for {model}")
+
+    # فشل النموذج الأساسي (أو قاطعه مفتوح) -> جرّب fallback إذا موجود
     if fallback_model:
-        try:
-            resp = client.responses.create(
-                model=fallback_model,
-                input=prompt,
-                temperature=min(temperature, 0.7),  # خفّض قليلاً لثبات أعلى
-            )
-            return resp.output_text
-        except Exception as e2:
-            last_err = e2
+        fb_breaker = get_breaker(fallback_model)
+        if fb_breaker.allow():
+            try:
+                # خفّض الحرارة قليلاً لثبات أعلى
+                tracing.note_retry()
+                text = _create(client, fallback_model, prompt, min(temperature, 0.7), extra, on_text)
+                fb_breaker.record_success()
+                tracing.set_outcome("fallback", model=fallback_model)
+                return text
+            except Exception as e2:
+                last_err = e2
+                if classify_error(e2) == "retryable":
+                    fb_breaker.record_failure()
+                else:
+                    fb_breaker.release()
+        else:
+            last_err = RuntimeError(f"circuit open for {model} and {fallback_model}")
 
     raise RuntimeError(f"LLM call failed. Last error: {last_err}")
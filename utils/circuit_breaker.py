@@ -0,0 +1,106 @@
+# utils/circuit_breaker.py
+# قاطع دائرة بسيط لكل مفتاح (نموذج LLM مثلًا): بعد عدد من الإخفاقات المتتالية يُفتح
+# لمدة تبريد، فتتجه الاستدعاءات مباشرة إلى البديل دون دفع المهلات مجددًا؛ بعدها
+# يُسمح بمحاولة تجريبية واحدة (half_open) تغلقه عند النجاح أو تعيد فتحه عند الفشل.
+
+import threading
+import time
+from typing import Dict, Optional
+
+FAILURE_THRESHOLD = 5     # إخفاقات متتالية قبل الفتح
+COOLDOWN_SECONDS = 60.0   # مدة بقاء القاطع مفتوحًا
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: Optional[int] = None,
+                 cooldown: Optional[float] = None):
+        self.name = name
+        # القيم الافتراضية تُقرأ الآن لا عند تعريف الدالة، فيسري configure_breakers على القواطع الجديدة
+        self.failure_threshold = FAILURE_THRESHOLD if failure_threshold is None else failure_threshold
+        self.cooldown = COOLDOWN_SECONDS if cooldown is None else cooldown
+        self._lock = threading.Lock()
+        self._state = "closed"      # closed | open | half_open
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        """
+        هل يُسمح بطلب الآن؟ في half_open يُسمح بطلب تجريبي واحد فقط.
+        """
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open" and time.time() - self._opened_at >= self.cooldown:
+                self._state = "half_open"
+                self._trial_running = False
+            if self._state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                self._state = "open"
+                self._opened_at = time.time()
+                self._trial_running = False
+
+    def release(self) -> None:
+        """
+        ينهي طلبًا سُمح به دون حكم على صحة الخدمة (خطأ في الطلب نفسه مثل 400/404):
+        يحرّر المحاولة التجريبية في half_open كي لا يبقى القاطع رافضًا كل الطلبات.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            state = self._state
+            if state == "open" and time.time() - self._opened_at >= self.cooldown:
+                state = "half_open"
+            return {
+                "state": state,
+                "failures": self._failures,
+                "opened_at": self._opened_at or None,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _registry_lock:
+        br = _breakers.get(name)
+        if br is None:
+            br = _breakers[name] = CircuitBreaker(name)
+        return br
+
+
+def breaker_states() -> Dict[str, Dict[str, object]]:
+    """
+    حالة كل القواطع المعروفة: {"gpt-5": {"state": "open", "failures": 5, "opened_at": ...}}
+    """
+    with _registry_lock:
+        items = list(_breakers.items())
+    return {name: br.snapshot() for name, br in items}
+
+
+def configure_breakers(failure_threshold: int = None, cooldown: float = None) -> None:
+    global FAILURE_THRESHOLD, COOLDOWN_SECONDS
+    if failure_threshold is not None:
+        FAILURE_THRESHOLD = int(failure_threshold)
+    if cooldown is not None:
+        COOLDOWN_SECONDS = float(cooldown)
+    with _registry_lock:
+        for br in _breakers.values():
+            br.failure_threshold = FAILURE_THRESHOLD
+            br.cooldown = COOLDOWN_SECONDS
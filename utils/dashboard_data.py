@@ -0,0 +1,98 @@
+# utils/dashboard_data.py
+# طبقة بيانات لوحة Streamlit: تحتفظ في الذاكرة بآخر لقطة (الإعدادات، أسعار كل الدول،
+# التغير اليومي، المعلّق في صندوق الصادر) وخيط خلفي يحدّثها دوريًا، فتُرسم
+# إعادة تشغيل السكربت عند كل تفاعل من الذاكرة دون شبكة أو قراءة ملفات.
+# سجل النشر عبر LogTail (قراءة تزايدية للأسطر الجديدة فقط).
+# لا تعتمد على streamlit؛ app.py يغلّفها بـ st.cache_resource لتكون نسخة واحدة لكل عملية.
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .fetch_utils import configure_rate_cache, get_country_rate
+from .log_tail import LogTail
+from .rate_analyzer import get_rate_changes
+
+HISTORY_CSV = os.path.join("data", "rates_history.csv")
+
+
+class DashboardData:
+    def __init__(self, config_path: str = "config/config.json", interval: float = 300.0):
+        self.config_path = config_path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._config: Dict[str, Any] = {}
+        self._config_mtime: Optional[float] = None
+        self.logs = LogTail()  # السجل يُقرأ تزايديًا؛ الاستعلام عنه من الذاكرة
+        self._snapshot: Dict[str, Any] = {"rates": {}, "changes": {},
+                                          "outbox_pending": [], "updated_at": None}
+
+    # ---------- الإعدادات: تُقرأ فقط إذا تغيّر الملف ----------
+    def config(self) -> Dict[str, Any]:
+        mtime = os.path.getmtime(self.config_path)
+        with self._lock:
+            if mtime != self._config_mtime:
+                with open(self.config_path, encoding="utf-8") as f:
+                    self._config = json.load(f)
+                self._config_mtime = mtime
+                configure_rate_cache(self._config.get("cache"))
+            return self._config
+
+    def refresh(self, force: bool = False) -> Dict[str, Any]:
+        """
+        يبني لقطة جديدة ويستبدلها ذريًا. force=True يتجاوز كاش الأسعار (زر التحديث اليدوي).
+        تحديثان متزامنان لا يتكرران: الثاني ينتظر الأول ثم يعيد ناتجه.
+        """
+        started = time.time()
+        with self._refresh_lock:
+            current = self.snapshot()
+            if not force and current["updated_at"] and current["updated_at"] >= started:
+                return current
+            config = self.config()
+            rates: Dict[str, Any] = {}
+            for cc in config["countries"]:
+                try:
+                    rates[cc] = get_country_rate(cc, force_refresh=force)
+                except Exception as e:
+                    rates[cc] = e
+            labels = [r["country"] for r in rates.values() if isinstance(r, dict)]
+            changes = get_rate_changes(HISTORY_CSV, labels) if labels else {}
+
+            self.logs.poll()
+            from exporter_wp import get_outbox  # كسول: يتجنب استيرادًا دائريًا عند تحميل utils
+            snap = {
+                "rates": rates,
+                "changes": changes,
+                "outbox_pending": [it["key"] for it in get_outbox().pending()],
+                "updated_at": time.time(),
+            }
+            with self._lock:
+                self._snapshot = snap
+            return snap
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._snapshot
+
+    # ---------- التحديث الخلفي ----------
+    def start(self) -> "DashboardData":
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="dashboard-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️ Dashboard refresh failed: {e}")
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
@@ -1,14 +1,40 @@
 # utils/fetch_utils.py
-# جلب مصدر الدولة + حفظ السجل مع إجبار reload لتطبيق التعديلات فورًا.
+# جلب مصدر الدولة (مع كاش TTL + تحديث بالخلفية) + حفظ السجل بالإلحاق فقط (مع ضغط دوري)،
+# مع reload لملف المصدر فقط عند تغيّر mtime لتطبيق التعديلات فورًا دون إعادة تنفيذه كل مرة.
 
+import csv
 import importlib
+import io
 import os
+import threading
+import time
+from contextlib import contextmanager
 from datetime import date
-from typing import Dict, Any, Optional
-import pandas as pd
+from typing import Dict, Any, Optional, Set, Tuple
+
+try:
+    import fcntl  # قفل بين العمليات (غير متوفر على ويندوز)
+except ImportError:
+    fcntl = None
 
 DATA_DIR = "data"
 HISTORY_CSV = os.path.join(DATA_DIR, "rates_history.csv")
+HISTORY_COLUMNS = ["date", "country", "buy", "sell"]
+
+# قفل السجل: مراحل الجلب تعمل بالتوازي، والضغط يستبدل الملف كاملًا
+_csv_lock = threading.Lock()
+
+# كاش الأسعار: TTL لكل دولة + نافذة stale-while-revalidate
+DEFAULT_RATE_TTL = 300          # ثوانٍ يُعتبر خلالها السعر حديثًا
+RATE_TTL: Dict[str, float] = {} # تخصيص لكل دولة، مثل {"egypt": 120}
+STALE_TTL = 3600                # بعد انتهاء TTL نخدم القيمة القديمة ونحدّث بالخلفية حتى هذا العمر
+
+_rate_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_refreshing: Set[str] = set()
+_cache_lock = threading.Lock()
+
+# mtime آخر نسخة محمّلة من كل ملف مصدر (لإعادة التحميل عند التعديل فقط)
+_module_mtimes: Dict[str, float] = {}
 
 def _ensure_dirs():
     os.makedirs(DATA_DIR, exist_ok=True)
@@ -20,10 +46,87 @@ def _round_num(x: Optional[float], ndigits: int = 6) -> Optional[float]:
     except Exception:
         return None
 
-def get_country_rate(country_code: str) -> Dict[str, Any]:
+def configure_rate_cache(cache_conf: Optional[Dict[str, Any]] = None) -> None:
+    """
+    يضبط الكاش من config["cache"]:
+      {"rate_ttl": {"default": 300, "egypt": 120}, "stale_ttl": 3600}
+    """
+    global DEFAULT_RATE_TTL, STALE_TTL
+    cache_conf = cache_conf or {}
+    ttl = dict(cache_conf.get("rate_ttl", {}))
+    if "default" in ttl:
+        DEFAULT_RATE_TTL = float(ttl.pop("default"))
+    RATE_TTL.update({k: float(v) for k, v in ttl.items()})
+    if "stale_ttl" in cache_conf:
+        STALE_TTL = float(cache_conf["stale_ttl"])
+
+def _ttl_for(country_code: str) -> float:
+    return RATE_TTL.get(country_code, DEFAULT_RATE_TTL)
+
+def _store(country_code: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    with _cache_lock:
+        _rate_cache[country_code] = (time.time(), dict(data))
+    return dict(data)
+
+def _refresh_in_background(country_code: str) -> None:
+    with _cache_lock:
+        if country_code in _refreshing:
+            return
+        _refreshing.add(country_code)
+
+    def _run():
+        try:
+            _store(country_code, _fetch_country_rate(country_code))
+        except Exception:
+            pass  # نبقي القيمة القديمة؛ المحاولة التالية ستعيد التحديث
+        finally:
+            with _cache_lock:
+                _refreshing.discard(country_code)
+
+    threading.Thread(target=_run, name=f"rate-refresh-{country_code}", daemon=True).start()
+
+def get_country_rate(country_code: str, force_refresh: bool = False) -> Dict[str, Any]:
+    """
+    يعيد سعر الدولة من الكاش إن كان حديثًا (ضمن TTL).
+    - بعد انتهاء TTL وحتى STALE_TTL: يعيد القيمة المخزنة فورًا ويحدّثها بالخلفية.
+    - force_refresh=True: يتجاوز الكاش ويجلب مباشرة من المصدر.
+    """
+    if not force_refresh:
+        with _cache_lock:
+            entry = _rate_cache.get(country_code)
+        if entry:
+            age = time.time() - entry[0]
+            if age < _ttl_for(country_code):
+                return dict(entry[1])
+            if age < _ttl_for(country_code) + STALE_TTL:
+                _refresh_in_background(country_code)
+                return dict(entry[1])
+    return _store(country_code, _fetch_country_rate(country_code))
+
+def _load_source(country_code: str):
+    """
+    يستورد data_sources.<country_code>، ويعيد تحميله 🔁 فقط إذا تغيّر mtime الملف
+    منذ آخر تحميل (تعديلات المصدر تُطبَّق فورًا دون إعادة التنفيذ في كل استدعاء).
+    """
+    name = f"data_sources.{country_code}"
+    module = importlib.import_module(name)
+    path = getattr(module, "__file__", None)
+    if not path:
+        return module
     try:
-        module = importlib.import_module(f"data_sources.{country_code}")
-        module = importlib.reload(module)  # 🔁 مهم جدًا
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return module
+    with _cache_lock:
+        previous = _module_mtimes.get(name)
+        _module_mtimes[name] = mtime
+    if previous is not None and previous != mtime:
+        module = importlib.reload(module)
+    return module
+
+def _fetch_country_rate(country_code: str) -> Dict[str, Any]:
+    try:
+        module = _load_source(country_code)
     except ModuleNotFoundError as e:
         raise RuntimeError(f"لا يوجد مصدر بيانات للدولة: {country_code} ({e})")
     if not hasattr(module, "get_rate"):
@@ -41,15 +144,112 @@ def get_country_rate(country_code: str) -> Dict[str, Any]:
         raise RuntimeError(f"قيم الأسعار غير صالحة للدولة {country_code}: {data}")
     return data
 
+def _csv_line(values) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerow(values)
+    return buf.getvalue()
+
+@contextmanager
+def _history_lock(csv_path: str):
+    """
+    قفل على مستوى الخيوط + العمليات (flock على ملف .lock بجانب السجل إن توفّر fcntl)،
+    حتى لا تتداخل إضافة سطر مع ضغط الملف من عملية أخرى.
+    """
+    with _csv_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(csv_path + ".lock", "a") as lf:
+            fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
 def save_rate_to_csv(data: Dict[str, Any], csv_path: str = HISTORY_CSV) -> None:
+    """
+    يضيف سطرًا واحدًا إلى نهاية السجل (O(1) مهما كبر الملف):
+    - كتابة واحدة بـ O_APPEND ثم fsync، فلا يُعاد كتابة الملف ولا يتلف عند انقطاع التشغيل.
+    - إذا انتهى الملف بسطر مبتور (تعطل سابق أثناء الكتابة) نبدأ سطرًا جديدًا بدل الإلحاق به.
+    """
     _ensure_dirs()
-    row = {"date": date.today().isoformat(), "country": data.get("country", ""), "buy": data.get("buy"), "sell": data.get("sell")}
+    row = [date.today().isoformat(), data.get("country", ""), data.get("buy"), data.get("sell")]
+    with _history_lock(csv_path):
+        created = not os.path.exists(csv_path)
+        fd = os.open(csv_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            chunk = ""
+            if size == 0:
+                chunk = _csv_line(HISTORY_COLUMNS)
+            elif os.pread(fd, 1, size - 1) != b"\n":
+                chunk = "\n"
+            chunk += _csv_line(row)
+            os.write(fd, chunk.encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        if created:
+            _fsync_dir(csv_path)
+
+def compact_history(csv_path: str = HISTORY_CSV) -> int:
+    """
+    يضغط السجل: يحذف إدخالات اليوم المكررة لنفس الدولة (يبقى آخرها) ويتجاهل الأسطر التالفة،
+    ثم يستبدل الملف ذريًا (ملف مؤقت + fsync + os.replace). يعيد عدد الأسطر المحذوفة.
+    """
     if not os.path.exists(csv_path):
-        pd.DataFrame([row], columns=["date", "country", "buy", "sell"]).to_csv(csv_path, index=False)
-        return
+        return 0
+    with _history_lock(csv_path):
+        latest: Dict[Tuple[str, str], list] = {}
+        total = 0
+        with open(csv_path, encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # العناوين
+            for rec in reader:
+                if len(rec) != len(HISTORY_COLUMNS) or not rec[0]:
+                    continue
+                total += 1
+                key = (rec[0], rec[1])
+                latest.pop(key, None)  # إعادة الإدراج تحفظ ترتيب آخر ظهور
+                latest[key] = rec
+
+        tmp_path = f"{csv_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(_csv_line(HISTORY_COLUMNS))
+            for rec in sorted(latest.values(), key=lambda r: r[0]):
+                f.write(_csv_line(rec))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, csv_path)
+        _fsync_dir(csv_path)
+        return total - len(latest)
+
+def maybe_compact_history(csv_path: str = HISTORY_CSV, every_days: int = 7) -> int:
+    """
+    ضغط دوري: يُنفَّذ إذا مرّ every_days يومًا على آخر ضغط (يُحفظ تاريخه في <csv>.compacted).
+    """
+    marker = csv_path + ".compacted"
+    today = date.today()
     try:
-        df = pd.read_csv(csv_path)
-    except Exception:
-        df = pd.DataFrame(columns=["date", "country", "buy", "sell"])
-    df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-    df.to_csv(csv_path, index=False)
+        with open(marker, encoding="utf-8") as f:
+            last = date.fromisoformat(f.read().strip())
+        if (today - last).days < every_days:
+            return 0
+    except (OSError, ValueError):
+        pass
+    removed = compact_history(csv_path)
+    with open(marker, "w", encoding="utf-8") as f:
+        f.write(today.isoformat())
+    return removed
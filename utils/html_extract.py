@@ -0,0 +1,153 @@
+# utils/html_extract.py
+# محرك استخراج مستهدف لصفحات البنوك: محددات تصريحية لكل مصدر تُنفَّذ بـ lxml مباشرة،
+# بتمريرة واحدة متدفقة تتوقف عند أول صف يحتوي الدولار (بدل إعادة بناء نص كل شجرة لكل وسم).
+
+import re
+from typing import Any, Dict, List, Optional, Union
+
+CHUNK_SIZE = 16 * 1024  # حجم الدفعة المغذّاة للمحلل المتدفق
+
+# أنواع المحددات:
+#   row          : أول عنصر من row_tags يحتوي أحد markers → نصوص cell_tags داخله
+#   cell_window  : أول خلية تحتوي أحد markers → نصوص before خلايا قبلها و after خلايا بعدها
+#   xpath        : تعبير XPath كامل (تحليل كامل للصفحة؛ للحالات التي لا يكفيها ما سبق)
+#   text_number  : أول رقم في نص الصفحة يطابق pattern ويقع ضمن [min, max]
+SPECS: Dict[str, Dict[str, Any]] = {
+    "cbe_ar": {"type": "row", "row_tags": ("tr",), "markers": ("الدولار",),
+               "cell_tags": ("td", "th", "span", "div")},
+    "cbe_en": {"type": "row", "row_tags": ("tr",), "markers": ("US Dollar",),
+               "cell_tags": ("td", "th", "span", "div")},
+    "cib": {"type": "row", "row_tags": ("tr", "li"), "markers": ("الدولار", "USD"),
+            "cell_tags": ("td", "th", "div", "span", "p")},
+    "banquemisr": {"type": "row", "row_tags": ("tr", "li"), "markers": ("الدولار", "USD"),
+                   "cell_tags": ("td", "th", "div", "span", "p")},
+    "cbj": {"type": "cell_window", "cell_tags": ("td", "th"), "markers": ("USD", "الدولار"),
+            "before": 3, "after": 5, "upper": True},
+    "cbi": {"type": "text_number", "pattern": r"\b(\d{3,4}(?:\.\d{1,3})?)\b",
+            "min": 900.0, "max": 2000.0},
+}
+
+Spec = Union[str, Dict[str, Any]]
+
+
+def _text(el) -> str:
+    # يكافئ get_text(" ", strip=True) في BeautifulSoup
+    return " ".join(s.strip() for s in el.itertext() if s and s.strip())
+
+
+def _resolve(spec: Spec) -> Dict[str, Any]:
+    if isinstance(spec, str):
+        try:
+            return SPECS[spec]
+        except KeyError:
+            raise KeyError(f"لا يوجد محدد استخراج باسم: {spec}")
+    return spec
+
+
+def _stream(html: str, tags):
+    """
+    يغذّي المحلل المتدفق على دفعات ويعيد العناصر المكتملة (حدث end) من الوسوم المطلوبة.
+    توقف المستهلك عن السحب يوقف التحليل في مكانه.
+    """
+    from lxml import etree  # تحميل كسول
+
+    parser = etree.HTMLPullParser(events=("end",), tag=tags)
+    for i in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[i:i + CHUNK_SIZE])
+        for _, el in parser.read_events():
+            yield el
+    parser.close()
+    for _, el in parser.read_events():
+        yield el
+
+
+def _extract_row(html: str, spec: Dict[str, Any]) -> List[str]:
+    markers = spec["markers"]
+    cell_tags = spec["cell_tags"]
+    for el in _stream(html, spec["row_tags"]):
+        txt = _text(el)
+        if any(m in txt for m in markers):
+            cells = [_text(c) for c in el.iter(*cell_tags) if c is not el]
+            return cells or [txt]
+    return []
+
+
+def _extract_cell_window(html: str, spec: Dict[str, Any]) -> List[str]:
+    markers = spec["markers"]
+    before, after = spec.get("before", 3), spec.get("after", 5)
+    upper = spec.get("upper", False)
+    window: List[str] = []
+    found_at = -1
+    for el in _stream(html, spec["cell_tags"]):
+        txt = _text(el)
+        if found_at < 0:
+            probe = txt.upper() if upper else txt
+            if any(m in probe for m in markers):
+                found_at = len(window)
+            window.append(txt)
+            if found_at < 0 and len(window) > before:
+                window.pop(0)
+            continue
+        window.append(txt)
+        if len(window) - found_at > after:
+            break
+    if found_at < 0:
+        return []
+    return window
+
+
+def _extract_xpath(html: str, spec: Dict[str, Any]) -> List[str]:
+    from lxml import html as lxml_html  # تحميل كسول
+
+    root = lxml_html.document_fromstring(html)
+    hits = root.xpath(spec["xpath"])
+    if not hits:
+        return []
+    first = hits[0]
+    if isinstance(first, str):
+        return [s.strip() for s in hits if s.strip()]
+    cell_xpath = spec.get("cell_xpath")
+    if cell_xpath:
+        return [_text(c) for c in first.xpath(cell_xpath)]
+    return [_text(first)]
+
+
+def first_number(html: str, spec: Spec = "cbi") -> Optional[float]:
+    """
+    أول رقم في نص الصفحة (بترتيب المستند، دون script/style) يقع ضمن [min, max].
+    يتوقف عند أول تطابق دون بناء نص الصفحة كاملًا.
+    """
+    from lxml import etree, html as lxml_html  # تحميل كسول
+
+    spec = _resolve(spec)
+    pattern = re.compile(spec["pattern"])
+    lo, hi = spec.get("min", float("-inf")), spec.get("max", float("inf"))
+    root = lxml_html.document_fromstring(html)
+    etree.strip_elements(root, "script", "style", with_tail=False)
+    for chunk in root.itertext():
+        for m in pattern.finditer(chunk):
+            try:
+                v = float(m.group(1))
+            except ValueError:
+                continue
+            if lo <= v <= hi:
+                return v
+    return None
+
+
+def extract_cells(html: str, spec: Spec) -> List[str]:
+    """
+    يعيد نصوص الخلايا حول صف/خلية الدولار وفق المحدد (اسم من SPECS أو dict).
+    قائمة فارغة إن لم يُعثر على الصف.
+    """
+    spec = _resolve(spec)
+    kind = spec.get("type", "row")
+    if not html:
+        return []
+    if kind == "row":
+        return _extract_row(html, spec)
+    if kind == "cell_window":
+        return _extract_cell_window(html, spec)
+    if kind == "xpath":
+        return _extract_xpath(html, spec)
+    raise ValueError(f"نوع محدد غير مدعوم لاستخراج الخلايا: {kind}")
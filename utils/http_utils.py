@@ -0,0 +1,160 @@
+# utils/http_utils.py
+# جلسة HTTP مشتركة لكل المصادر: تجميع اتصالات (keep-alive) + إعادة محاولة + طلبات شرطية
+# (ETag / If-Modified-Since) تعيد استخدام المحتوى المخزّن عند رد 304.
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))  # عدد المضيفين المحتفظ بمجمّعاتهم
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))          # اتصالات لكل مضيف
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+# مهلة القراءة لا تُعاد افتراضيًا: مصدر بطيء يكلف timeout واحدًا لا (1 + n) منه،
+# فيبقى الجلب المتحوّط والمقيّد بالمهلة كما صُمّم؛ الاتصال ورموز 429/5xx تُعاد كالمعتاد
+READ_RETRIES = int(os.getenv("HTTP_READ_RETRIES", "0"))
+BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.3"))
+CONDITIONAL_CACHE_SIZE = 256  # عدد الروابط المحفوظة للطلبات الشرطية
+# إعادة توجيه الروابط حسب البادئة (قياس/اختبار دون شبكة ضد خوادم محلية):
+# HTTP_URL_REWRITES='{"https://www.cbe.org.eg": "http://127.0.0.1:8000/pages/www.cbe.org.eg"}'
+URL_REWRITES: Dict[str, str] = json.loads(os.getenv("HTTP_URL_REWRITES") or "{}")
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_validators: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_validators_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=READ_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session()
+        return _session
+
+
+def configure_http(pool_connections: Optional[int] = None,
+                   pool_maxsize: Optional[int] = None,
+                   max_retries: Optional[int] = None,
+                   backoff_factor: Optional[float] = None,
+                   read_retries: Optional[int] = None,
+                   url_rewrites: Optional[Dict[str, str]] = None) -> None:
+    """
+    يعيد ضبط الجلسة المشتركة بأحجام مجمّع/محاولات مختلفة (تُبنى الجلسة الجديدة عند أول طلب).
+    url_rewrites: {بادئة أصلية: بادئة بديلة} تُضاف إلى URL_REWRITES.
+    """
+    global POOL_CONNECTIONS, POOL_MAXSIZE, MAX_RETRIES, READ_RETRIES, BACKOFF_FACTOR, _session
+    if url_rewrites:
+        URL_REWRITES.update(url_rewrites)
+    with _session_lock:
+        if pool_connections is not None:
+            POOL_CONNECTIONS = int(pool_connections)
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = int(pool_maxsize)
+        if max_retries is not None:
+            MAX_RETRIES = int(max_retries)
+        if backoff_factor is not None:
+            BACKOFF_FACTOR = float(backoff_factor)
+        if read_retries is not None:
+            READ_RETRIES = int(read_retries)
+        old, _session = _session, None
+    if old is not None:
+        old.close()
+
+
+def rewrite_url(url: str) -> str:
+    for prefix, target in URL_REWRITES.items():
+        if url.startswith(prefix):
+            return target + url[len(prefix):]
+    return url
+
+
+def _cache_key(url: str, params: Optional[Dict[str, Any]]) -> str:
+    if not params:
+        return url
+    return url + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+
+def _from_cache(entry: Dict[str, Any], fresh: requests.Response) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = entry["content"]
+    resp.encoding = entry["encoding"]
+    resp.headers.update(entry["headers"])
+    resp.url = fresh.url
+    resp.request = fresh.request
+    resp.from_cache = True
+    return resp
+
+
+def http_get(url: str,
+             params: Optional[Dict[str, Any]] = None,
+             headers: Optional[Dict[str, str]] = None,
+             timeout: float = 15,
+             conditional: bool = True) -> requests.Response:
+    """
+    GET عبر الجلسة المشتركة.
+    - conditional=True: يرسل If-None-Match / If-Modified-Since إن سبق جلب الرابط،
+      وعند 304 يعيد Response بحالة 200 ومحتوى النسخة المخزّنة (resp.from_cache=True).
+    """
+    if URL_REWRITES:
+        url = rewrite_url(url)
+    key = _cache_key(url, params)
+    hdrs = dict(headers or {})
+    entry = None
+    if conditional:
+        with _validators_lock:
+            entry = _validators.get(key)
+            if entry is not None:
+                _validators.move_to_end(key)
+        if entry is not None:
+            if entry.get("etag"):
+                hdrs["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                hdrs["If-Modified-Since"] = entry["last_modified"]
+
+    resp = get_session().get(url, params=params, headers=hdrs, timeout=timeout)
+
+    if resp.status_code == 304 and entry is not None:
+        return _from_cache(entry, resp)
+
+    if conditional and resp.status_code == 200:
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        if etag or last_modified:
+            with _validators_lock:
+                _validators[key] = {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "content": resp.content,
+                    "encoding": resp.encoding,
+                    "headers": dict(resp.headers),
+                }
+                _validators.move_to_end(key)
+                while len(_validators) > CONDITIONAL_CACHE_SIZE:
+                    _validators.popitem(last=False)
+    resp.from_cache = False
+    return resp
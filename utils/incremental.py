@@ -0,0 +1,136 @@
+# utils/incremental.py
+# التوليد التزايدي: كل مقال يُحفظ في data/articles مع ملف مدخلاته (<date>-<cc>.json).
+# في التشغيل التالي نقارن السعر الجديد بمدخلات آخر مقال ولّده النموذج؛ إذا لم يتجاوز
+# التغير العتبة نعيد استخدام المقال السابق بعد تحديث أرقامه وتاريخه (أو نتخطى الدولة)،
+# فلا يمرّ عبر النموذج إلا ما تحرّك فعلًا.
+
+import glob
+import json
+import os
+import re
+from typing import Any, Dict, Optional, Tuple
+
+ARTICLES_DIR = os.path.join("data", "articles")
+
+
+def inputs_path(md_path: str) -> str:
+    return os.path.splitext(md_path)[0] + ".json"
+
+
+def save_inputs(md_path: str, fetched: Dict[str, Any], title: str, desc: str,
+                today: str, base: Optional[Dict[str, Any]] = None, generator: str = "llm") -> str:
+    """
+    يحفظ مدخلات المقال بجانبه. base = مدخلات آخر توليد فعلي بالنموذج (يُورَّث
+    عند إعادة الاستخدام حتى لا تتراكم فروق صغيرة يومًا بعد يوم دون إعادة توليد).
+    generator = "llm" أو "template" (وضع القوالب أو بديل عند تعثّر النموذج).
+    """
+    rate, change = fetched["rate"], fetched["change"]
+    if base is None:
+        base = {"date": today, "buy": rate["buy"], "sell": rate["sell"],
+                "direction": change.get("direction", "stable")}
+    record = {
+        "country_code": fetched["country_code"],
+        "date": today,
+        "rate": rate,
+        "change": change,
+        "title": title,
+        "desc": desc,
+        "base": base,
+        "generator": generator,
+    }
+    path = inputs_path(md_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def load_previous(country_code: str, articles_dir: str = ARTICLES_DIR) -> Optional[Dict[str, Any]]:
+    """
+    أحدث مقال محفوظ للدولة مع مدخلاته: {"inputs": {...}, "markdown": "..."} أو None.
+    """
+    candidates = sorted(glob.glob(os.path.join(articles_dir, f"????-??-??-{country_code}.json")))
+    for path in reversed(candidates):
+        md_path = os.path.splitext(path)[0] + ".md"
+        try:
+            with open(path, encoding="utf-8") as f:
+                inputs = json.load(f)
+            with open(md_path, encoding="utf-8") as f:
+                markdown_text = f.read()
+        except (OSError, ValueError):
+            continue
+        return {"inputs": inputs, "markdown": markdown_text}
+    return None
+
+
+def rate_delta_pct(old: Dict[str, Any], new: Dict[str, Any]) -> float:
+    """
+    أكبر تغير نسبي (%) بين سعري الشراء والبيع.
+    """
+    delta = 0.0
+    for k in ("buy", "sell"):
+        a, b = float(old[k]), float(new[k])
+        if a:
+            delta = max(delta, abs(b - a) / abs(a) * 100.0)
+        elif b:
+            return float("inf")
+    return delta
+
+
+def is_unchanged(prev_inputs: Dict[str, Any], fetched: Dict[str, Any], threshold_pct: float) -> bool:
+    if prev_inputs.get("generator", "llm") != "llm":
+        return False  # مقال قوالب (مثلًا بعد تعثّر النموذج) ليس أساسًا يُعاد استخدامه → توليد جديد
+    base = prev_inputs.get("base") or prev_inputs["rate"]
+    if fetched["change"].get("direction", "stable") != base.get("direction", "stable"):
+        return False  # انقلاب الاتجاه يغيّر رواية المقال → توليد جديد
+    return rate_delta_pct(base, fetched["rate"]) <= threshold_pct
+
+
+# صيغ كتابة الرقم المحتملة في نص النموذج: كما هو، بمنزلتين، بفواصل الآلاف، ومختصرًا
+_NUMBER_FORMATS = (str, "{:.2f}".format, "{:,.2f}".format, "{:g}".format)
+
+
+def refresh_text(text: str, prev_inputs: Dict[str, Any], fetched: Dict[str, Any], today: str) -> str:
+    """
+    يستبدل أرقام وتاريخ المقال السابق بالقيم الجديدة في مرور واحد (دون تصادم
+    بين قيمة قديمة وجديدة متطابقتين). يُستبدل الرقم كاملًا فقط: "1310" لا يطابق
+    داخل "1310.5"، والنقطة في نهاية الجملة ليست جزءًا من الرقم.
+
+    >>> prev = {"rate": {"buy": 1310, "sell": 1312.5}, "change": {}, "date": "2025-01-01"}
+    >>> new = {"rate": {"buy": 1325, "sell": 1327.25}, "change": {}}
+    >>> refresh_text("الشراء 1310 والبيع 1312.5، والوسطي 1310.75.", prev, new, "2025-01-02")
+    'الشراء 1325 والبيع 1327.25، والوسطي 1310.75.'
+    """
+    old_rate, new_rate = prev_inputs["rate"], fetched["rate"]
+    mapping: Dict[str, str] = {}
+    for k in ("buy", "sell"):
+        for fmt in _NUMBER_FORMATS:
+            old_v, new_v = old_rate[k], new_rate[k]
+            if fmt is not str:
+                old_v, new_v = float(old_v), float(new_v)
+            mapping.setdefault(fmt(old_v), fmt(new_v))
+    old_change = prev_inputs.get("change", {}).get("change")
+    if old_change is not None:
+        mapping[f"{old_change}%"] = f"{fetched['change'].get('change')}%"
+    if prev_inputs.get("date"):
+        mapping[prev_inputs["date"]] = today
+    mapping = {k: v for k, v in mapping.items() if k != v}
+    if not mapping:
+        return text
+    pattern = re.compile(
+        r"(?<![\d.])(?<!\d,)(?:" + "|".join(re.escape(k) for k in sorted(mapping, key=len, reverse=True)) + r")(?!\d|[.,]\d)"
+    )
+    return pattern.sub(lambda m: mapping[m.group(0)], text)
+
+
+def reuse_previous(prev: Dict[str, Any], fetched: Dict[str, Any], today: str) -> Tuple[str, str, str]:
+    """
+    يعيد (markdown, title, desc) للمقال السابق بعد تحديث الأرقام والتاريخ.
+    """
+    inputs = prev["inputs"]
+    return (
+        refresh_text(prev["markdown"], inputs, fetched, today),
+        refresh_text(inputs.get("title", ""), inputs, fetched, today),
+        refresh_text(inputs.get("desc", ""), inputs, fetched, today),
+    )
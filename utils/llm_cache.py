@@ -0,0 +1,116 @@
+# utils/llm_cache.py
+# كاش قرصي اختياري لردود LLM مفهرس بالمحتوى: المفتاح = sha256(model, prompt, temperature, ...).
+# إخلاء LRU حسب الحجم الكلي + مدة صلاحية TTL. مفيد لإعادة التشغيل في نفس اليوم
+# ولإعادة تشغيل حتمية عند التصحيح.
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join("data", "llm_cache"))
+ENABLED = os.getenv("LLM_CACHE", "false").lower() in ("1", "true", "yes")
+MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "50")) * 1024 * 1024)
+TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_HOURS", "24")) * 3600
+
+_lock = threading.Lock()
+
+
+def configure_llm_cache(conf: Optional[Dict[str, Any]] = None) -> None:
+    """
+    يضبط الكاش من config["llm_cache"]:
+      {"enabled": true, "dir": "data/llm_cache", "max_mb": 50, "ttl_hours": 24}
+    """
+    global CACHE_DIR, ENABLED, MAX_BYTES, TTL_SECONDS
+    conf = conf or {}
+    if "enabled" in conf:
+        ENABLED = bool(conf["enabled"])
+    if "dir" in conf:
+        CACHE_DIR = conf["dir"]
+    if "max_mb" in conf:
+        MAX_BYTES = int(float(conf["max_mb"]) * 1024 * 1024)
+    if "ttl_hours" in conf:
+        TTL_SECONDS = float(conf["ttl_hours"]) * 3600
+
+
+def cache_key(model: str, prompt: str, temperature: float, **extra: Any) -> str:
+    payload = {"model": model, "prompt": prompt, "temperature": temperature}
+    payload.update(extra)
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key[:2], key + ".json")
+
+
+def get(key: str) -> Optional[str]:
+    """
+    يعيد النص المخزّن أو None (غير موجود / منتهي الصلاحية / تالف).
+    القراءة تحدّث mtime ليعمل الإخلاء كـ LRU.
+    """
+    path = _path(key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - entry.get("created_at", 0) > TTL_SECONDS:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return entry.get("text")
+
+
+def put(key: str, text: str, meta: Optional[Dict[str, Any]] = None) -> None:
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {"created_at": time.time(), "text": text, "meta": meta or {}}
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    _evict()
+
+
+def _evict() -> None:
+    """
+    يحذف الأقدم استخدامًا (mtime) حتى يعود الحجم الكلي تحت MAX_BYTES.
+    """
+    with _lock:
+        files = []
+        total = 0
+        for root, _, names in os.walk(CACHE_DIR):
+            for n in names:
+                if not n.endswith(".json"):
+                    continue
+                p = os.path.join(root, n)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, p))
+                total += st.st_size
+        if total <= MAX_BYTES:
+            return
+        for _, size, p in sorted(files):
+            try:
+                os.remove(p)
+            except OSError:
+                continue
+            total -= size
+            if total <= MAX_BYTES:
+                break
+
+
+def clear() -> None:
+    import shutil
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
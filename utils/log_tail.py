@@ -0,0 +1,106 @@
+# utils/log_tail.py
+# قارئ تزايدي لسجل النشر data/logs.txt: يتذكر موضع آخر بايت قرأه فيقرأ الأسطر الجديدة
+# فقط، ويحتفظ بآخر N مدخلًا في حلقة محدودة (deque)، مع استعلام مُصفّح ومرشّح حسب
+# الدولة/التاريخ/الفشل. عند أول فتح لملف ضخم يقرأ ذيله فقط، فيبقى فتح اللوحة فوريًا.
+
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+LOGS_PATH = os.path.join("data", "logs.txt")
+AVG_LINE_BYTES = 64  # لتقدير حجم الذيل المقروء عند أول فتح
+LEDGER_MARKER = "ledger"  # حقل أخير في أسطر المرآة التي سُجّلت محاولتها في publish_ledger
+
+
+def parse_line(line: str) -> Optional[Dict[str, Any]]:
+    """
+    "2025-01-31 | egypt | 123 | ledger" → {"date", "country", "result", "failed", "in_ledger"}؛
+    سطر تالف أو تعليق → None.
+    """
+    if line.startswith("#"):
+        return None
+    parts = [p.strip() for p in line.split("|")]
+    in_ledger = len(parts) > 3 and parts[-1] == LEDGER_MARKER
+    if in_ledger:
+        parts.pop()
+    if len(parts) < 3 or not parts[0]:
+        return None
+    result = " | ".join(parts[2:])
+    return {"date": parts[0], "country": parts[1], "result": result,
+            "failed": result.startswith("failed"), "in_ledger": in_ledger}
+
+
+class LogTail:
+    def __init__(self, path: str = LOGS_PATH, capacity: int = 5000):
+        self.path = path
+        self.capacity = capacity
+        self.entries: deque = deque(maxlen=capacity)
+        self._offset = 0
+        self._partial = b""
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def _reset(self) -> None:
+        self.entries.clear()
+        self._offset = 0
+        self._partial = b""
+
+    def poll(self) -> int:
+        """
+        يقرأ ما أُلحق بالملف منذ آخر استدعاء ويعيد عدد المدخلات الجديدة.
+        ملف استُبدل أو قُصّ (inode مختلف أو حجم أصغر) يُعاد قراءته من ذيله.
+        """
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset()
+                return 0
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                self._reset()
+                self._inode = st.st_ino
+                budget = self.capacity * AVG_LINE_BYTES
+                if st.st_size > budget:
+                    self._offset = st.st_size - budget
+                    self._partial = None  # تجاهل أول سطر مقطوع
+            if st.st_size == self._offset:
+                return 0
+
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read(st.st_size - self._offset)
+            self._offset += len(chunk)
+
+            if self._partial is None:
+                nl = chunk.find(b"\n")
+                if nl < 0:
+                    return 0
+                chunk, self._partial = chunk[nl + 1:], b""
+            lines = (self._partial + chunk).split(b"\n")
+            self._partial = lines.pop()  # سطر لم يكتمل بعد يُستكمل في الاستدعاء التالي
+            added = 0
+            for raw in lines:
+                entry = parse_line(raw.decode("utf-8", errors="replace"))
+                if entry is not None:
+                    self.entries.append(entry)
+                    added += 1
+            return added
+
+    def query(self, country: Optional[str] = None, date_from: Optional[str] = None,
+              date_to: Optional[str] = None, failed_only: bool = False,
+              page: int = 1, per_page: int = 50) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        يعيد (صفحة من المدخلات الأحدث أولًا، إجمالي المطابق). التواريخ بصيغة ISO (مقارنة نصية).
+        """
+        with self._lock:
+            items = list(self.entries)
+        matched = [
+            e for e in reversed(items)
+            if (country is None or e["country"] == country)
+            and (date_from is None or e["date"] >= date_from)
+            and (date_to is None or e["date"] <= date_to)
+            and (not failed_only or e["failed"])
+        ]
+        start = max(0, (page - 1) * per_page)
+        return matched[start:start + per_page], len(matched)
@@ -1,5 +1,6 @@
 # utils/meta_utils.py
 # توليد عناوين ووصف Meta واقعية وقصيرة عبر LLM + اختيار أفضل خيار وفق الطول والكلمة المفتاحية.
+# يدعم وضعًا مدمجًا: طلب واحد بمخرجات منظّمة يعيد المقال والميتا معًا.
 
 import json
 import re
@@ -49,18 +50,9 @@ def _safe_json_loads(raw: str) -> dict:
                 pass
     return {}
 
-def generate_meta(country_name: str,
-                  iso_date: str,
-                  currency_name: str,
-                  buy: float,
-                  sell: float,
-                  model: str) -> Tuple[str, str]:
-    """
-    يعيد (title, description) وفق أفضل اختيار من 3 اقتراحات من LLM،
-    مع بدائل احتياطية إذا فشل التحليل أو تجاوزت الحدود.
-    """
+def build_meta_prompt(country_name: str, iso_date: str, buy: float, sell: float) -> str:
     keyword = f"سعر الدولار اليوم في {country_name}"
-    meta_prompt = f"""
+    return f"""
 اقترح 3 عناوين عربية قصيرة (≤{MAX_TITLE} حرفًا) و3 أوصاف Meta (≤{MAX_DESC} حرفًا)
 لمقال عن "{keyword}" بتاريخ {iso_date}.
 أدرج في أحد العناوين سعر الشراء {buy} وسعر البيع {sell} بطريقة طبيعية دون تهويل.
@@ -68,9 +60,13 @@ def generate_meta(country_name: str,
 {{"titles": ["...","...","..."], "descriptions": ["...","...","..."]}}
 لا تضف أي نص آخر خارج JSON.
 """
-    raw = call_llm(meta_prompt, model=model, temperature=0.6)
-    data = _safe_json_loads(raw)
 
+def select_meta(data: dict, country_name: str, iso_date: str, currency_name: str) -> Tuple[str, str]:
+    """
+    يختار (title, description) من {"titles": [...], "descriptions": [...]} عبر _pick_best،
+    مع بدائل احتياطية وضمان الحدود النهائية.
+    """
+    keyword = f"سعر الدولار اليوم في {country_name}"
     titles = data.get("titles", []) if isinstance(data, dict) else []
     descs  = data.get("descriptions", []) if isinstance(data, dict) else []
 
@@ -82,3 +78,72 @@ def generate_meta(country_name: str,
     desc  = desc[:MAX_DESC]
 
     return title, desc
+
+def meta_from_raw(raw: str, country_name: str, iso_date: str, currency_name: str) -> Tuple[str, str]:
+    """
+    (title, description) من رد نصي خام لبرومبت build_meta_prompt (مثل نتائج وضع الدُفعات).
+    """
+    return select_meta(_safe_json_loads(raw or ""), country_name, iso_date, currency_name)
+
+def generate_meta(country_name: str,
+                  iso_date: str,
+                  currency_name: str,
+                  buy: float,
+                  sell: float,
+                  model: str) -> Tuple[str, str]:
+    """
+    يعيد (title, description) وفق أفضل اختيار من 3 اقتراحات من LLM،
+    مع بدائل احتياطية إذا فشل التحليل أو تجاوزت الحدود.
+    """
+    raw = call_llm(build_meta_prompt(country_name, iso_date, buy, sell), model=model, temperature=0.6)
+    return meta_from_raw(raw, country_name, iso_date, currency_name)
+
+# مخطط المخرجات المنظّمة للوضع المدمج (المقال + الميتا في طلب واحد)
+ARTICLE_META_SCHEMA = {
+    "name": "article_with_meta",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "article": {"type": "string"},
+            "titles": {"type": "array", "items": {"type": "string"}},
+            "descriptions": {"type": "array", "items": {"type": "string"}},
+        },
+        "required": ["article", "titles", "descriptions"],
+        "additionalProperties": False,
+    },
+}
+
+def build_combined_prompt(article_prompt: str, country_name: str, iso_date: str, buy: float, sell: float) -> str:
+    keyword = f"سعر الدولار اليوم في {country_name}"
+    return f"""{article_prompt}
+
+🔹 المطلوب في الرد نفسه إضافة إلى المقال:
+- 3 عناوين عربية قصيرة (≤{MAX_TITLE} حرفًا) لمقال عن "{keyword}" بتاريخ {iso_date}، أحدها يذكر سعر الشراء {buy} وسعر البيع {sell} بطريقة طبيعية.
+- 3 أوصاف Meta (≤{MAX_DESC} حرفًا).
+أعد JSON فقط بهذا الشكل، والمقال بصيغة Markdown داخل الحقل article:
+{{"article": "...", "titles": ["...","...","..."], "descriptions": ["...","...","..."]}}
+"""
+
+def generate_article_and_meta(article_prompt: str,
+                              country_name: str,
+                              iso_date: str,
+                              currency_name: str,
+                              buy: float,
+                              sell: float,
+                              model: str,
+                              temperature: float = 0.8) -> Tuple[str, str, str]:
+    """
+    الوضع المدمج: طلب واحد بمخرجات منظّمة يعيد (article_md, title, description).
+    تُطبّق نفس قواعد _pick_best والبدائل الاحتياطية على العناوين والأوصاف.
+    إذا لم يحتوِ الرد على مقال نعود للمسار المعتاد (طلب للمقال + generate_meta).
+    """
+    prompt = build_combined_prompt(article_prompt, country_name, iso_date, buy, sell)
+    raw = call_llm(prompt, model=model, temperature=temperature, json_schema=ARTICLE_META_SCHEMA)
+    data = _safe_json_loads(raw)
+    article = data.get("article", "") if isinstance(data, dict) else ""
+    if not isinstance(article, str) or not article.strip():
+        article = call_llm(article_prompt, model=model, temperature=temperature)
+        title, desc = generate_meta(country_name, iso_date, currency_name, buy, sell, model)
+        return article, title, desc
+    title, desc = select_meta(data, country_name, iso_date, currency_name)
+    return article, title, desc
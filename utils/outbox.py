@@ -0,0 +1,198 @@
+# utils/outbox.py
+# صندوق صادر (outbox) دائم على القرص: كل عنصر ملف JSON يُكتب ذريًا قبل الإرسال
+# ويُحذف عند النجاح؛ الإخفاقات تُعاد جدولتها بـ backoff أُسّي، وبعد عدد محاولات
+# تنتقل إلى dead/ للمراجعة اليدوية. OutboxWorker خيط خلفي يعيد إرسال المستحق.
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl  # قفل بين العمليات: عامل واحد فقط يفرّغ الصندوق في كل لحظة
+except ImportError:
+    fcntl = None
+
+OUTBOX_DIR = os.path.join("data", "outbox")
+
+
+def _safe_name(key: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in key)
+
+
+def _atomic_write_json(path: str, obj: Dict[str, Any]) -> None:
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Outbox:
+    def __init__(self, directory: str = OUTBOX_DIR, max_attempts: int = 20,
+                 base_delay: float = 30.0, max_delay: float = 3600.0):
+        self.directory = directory
+        self.dead_dir = os.path.join(directory, "dead")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        os.makedirs(self.dead_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, _safe_name(key) + ".json")
+
+    def enqueue(self, key: str, payload: Dict[str, Any]) -> str:
+        """
+        يضيف عنصرًا (أو يستبدل عنصرًا معلّقًا بنفس المفتاح) ويصبح مستحقًا فورًا.
+        لكل إدراج "version" فريد؛ ack/retry_later لا يمسّان نسخة أحدث أُدرجت أثناء الإرسال.
+        """
+        item = {"key": key, "payload": payload, "attempts": 0, "next_at": 0.0,
+                "enqueued_at": time.time(), "version": uuid.uuid4().hex, "last_error": None}
+        path = self._path(key)
+        with self._lock:
+            _atomic_write_json(path, item)
+        return path
+
+    def _load_all(self) -> List[Dict[str, Any]]:
+        items = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    items.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return items
+
+    def pending(self) -> List[Dict[str, Any]]:
+        return self._load_all()
+
+    def due(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        return [it for it in self._load_all() if it.get("next_at", 0) <= now]
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def ack(self, item: Dict[str, Any]) -> None:
+        """
+        يحذف العنصر المُرسَل فقط إن كان ما على القرص هو نفس النسخة؛ إعادة إدراج
+        المفتاح أثناء الإرسال تترك النسخة الجديدة مستحقة للدورة التالية.
+        """
+        path = self._path(item["key"])
+        with self._lock:
+            current = self._read(path)
+            if current is None or current.get("version") != item.get("version"):
+                return
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def retry_later(self, item: Dict[str, Any], error: str) -> None:
+        path = self._path(item["key"])
+        with self._lock:
+            current = self._read(path)
+            if current is None or current.get("version") != item.get("version"):
+                return  # استُبدل بنسخة أحدث (محاولاتها تبدأ من الصفر)
+            item = current
+            item["attempts"] = item.get("attempts", 0) + 1
+            item["last_error"] = error
+            if item["attempts"] >= self.max_attempts:
+                _atomic_write_json(os.path.join(self.dead_dir, os.path.basename(path)), item)
+                os.remove(path)
+                return
+            delay = min(self.max_delay, self.base_delay * (2 ** (item["attempts"] - 1)))
+            item["next_at"] = time.time() + delay * random.uniform(0.8, 1.2)
+            _atomic_write_json(path, item)
+
+
+# handler: يستقبل عناصر مستحقة ويعيد [(نجح؟, رسالة الخطأ), ...] بنفس الترتيب
+BatchHandler = Callable[[List[Dict[str, Any]]], List[Tuple[bool, Optional[str]]]]
+
+
+class OutboxWorker(threading.Thread):
+    def __init__(self, outbox: Outbox, handler: BatchHandler, interval: float = 5.0):
+        super().__init__(name="outbox-worker", daemon=True)
+        self.outbox = outbox
+        self.handler = handler
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._run_lock = threading.Lock()
+
+    def process_once(self) -> int:
+        """
+        يرسل العناصر المستحقة مرة واحدة ويعيد عددها. إذا كان عامل في عملية أخرى
+        يفرّغ الصندوق الآن نتخطى هذه الدورة.
+        """
+        with self._run_lock:
+            lock_file = None
+            if fcntl is not None:
+                lock_file = open(os.path.join(self.outbox.directory, ".lock"), "a")
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    return 0
+            try:
+                items = self.outbox.due()
+                if not items:
+                    return 0
+                try:
+                    results = self.handler(items)
+                except Exception as e:
+                    results = [(False, str(e))] * len(items)
+                for item, (ok, err) in zip(items, results):
+                    if ok:
+                        self.outbox.ack(item)
+                    else:
+                        self.outbox.retry_later(item, err or "unknown")
+                return len(items)
+            finally:
+                if lock_file is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                    lock_file.close()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.process_once()
+            except Exception as e:
+                print(f"⚠️ Outbox worker error: {e}")
+            self._stop_event.wait(self.interval)
+
+    def drain(self, timeout: float = 60.0) -> int:
+        """
+        يفرّغ الصندوق حتى يفرغ أو تنتهي المهلة، منتظرًا العناصر التي يحين موعدها قبلها.
+        يعيد عدد المعلّق المتبقي (يبقى على القرص لتشغيل لاحق).
+        """
+        deadline = time.time() + timeout
+        while True:
+            pending = self.outbox.pending()
+            if not pending:
+                return 0
+            now = time.time()
+            next_at = min(it.get("next_at", 0) for it in pending)
+            if next_at > deadline or now >= deadline:
+                return len(pending)
+            if next_at > now:
+                time.sleep(min(next_at, deadline) - now)
+            elif self.process_once() == 0:
+                time.sleep(0.2)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop_event.is_set()
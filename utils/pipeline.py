@@ -0,0 +1,78 @@
+# utils/pipeline.py
+# مشغّل خطّي متوازٍ (pipeline): لكل مرحلة مجمّع عمّال مستقل بحد تزامن خاص به،
+# وكل عنصر (دولة) ينتقل بين المراحل بمجرد انتهائه من المرحلة السابقة دون انتظار البقية.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# مرحلة = (الاسم، الدالة، عدد العمّال). الدالة تستقبل ناتج المرحلة السابقة.
+Stage = Tuple[str, Callable[[Any], Any], int]
+
+
+def run_pipeline(items: Iterable[Any],
+                 stages: List[Stage],
+                 on_done: Optional[Callable[[Any, Dict[str, Any]], None]] = None) -> Dict[Any, Dict[str, Any]]:
+    """
+    يمرّر كل عنصر عبر المراحل بالترتيب، مع مجمّع خيوط مستقل لكل مرحلة.
+    - أول مرحلة تستقبل العنصر نفسه، وكل مرحلة لاحقة تستقبل ناتج سابقتها.
+    - فشل عنصر في مرحلة ما يوقفه وحده ولا يؤثر على بقية العناصر.
+    - on_done(item, result): تُستدعى عند انتهاء كل عنصر (نجاحًا أو فشلًا).
+
+    Returns:
+      {item: {"result": <ناتج آخر مرحلة أو None>, "error": Exception|None, "stage": "<آخر مرحلة وصلها>"}}
+    """
+    items = list(items)
+    results: Dict[Any, Dict[str, Any]] = {}
+    if not items:
+        return results
+    if not stages:
+        return {it: {"result": it, "error": None, "stage": None} for it in items}
+
+    pools = [
+        ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix=f"pipe-{name}")
+        for name, _, workers in stages
+    ]
+    lock = threading.Lock()
+    remaining = [len(items)]
+    all_done = threading.Event()
+
+    def _finish(item, result, error, stage_name):
+        entry = {"result": result, "error": error, "stage": stage_name}
+        with lock:
+            results[item] = entry
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if on_done:
+            try:
+                on_done(item, entry)
+            except Exception:
+                pass
+        if last:
+            all_done.set()
+
+    def _submit(idx, item, value):
+        name, fn, _ = stages[idx]
+        fut = pools[idx].submit(fn, value)
+        fut.add_done_callback(lambda f: _advance(idx, item, f))
+
+    def _advance(idx, item, fut):
+        name = stages[idx][0]
+        err = fut.exception()
+        if err is not None:
+            _finish(item, None, err, name)
+            return
+        value = fut.result()
+        if idx + 1 < len(stages):
+            _submit(idx + 1, item, value)
+        else:
+            _finish(item, value, None, name)
+
+    try:
+        for it in items:
+            _submit(0, it, it)
+        all_done.wait()
+    finally:
+        for p in pools:
+            p.shutdown(wait=True)
+    return results
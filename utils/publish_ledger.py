@@ -0,0 +1,239 @@
+# utils/publish_ledger.py
+# دفتر نشر منظّم (SQLite) بدل أسطر logs.txt الحرة: كل محاولة نشر تُسجَّل بالدولة والتاريخ
+# والـ slug والنتيجة وPost ID وحالة HTTP وزمن الاستجابة وبصمة المحتوى، مع فهارس على
+# الدولة/التاريخ/الحالة فتبقى الاستعلامات الشائعة O(log n) مهما كبر الدفتر.
+# logs.txt يبقى مرآة قديمة للتوافق.
+#
+# الاستخدام:
+#   python -m utils.publish_ledger failures --country iraq --since 2025-01-01
+#   python -m utils.publish_ledger post --country egypt [--date 2025-01-31]
+#   python -m utils.publish_ledger recent --limit 20 [--country jordan] [--failed]
+#   python -m utils.publish_ledger import-logs          # استيراد logs.txt القديم مرة واحدة
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+LEDGER_PATH = os.getenv("PUBLISH_LEDGER_PATH", os.path.join("data", "publish_ledger.sqlite3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id           INTEGER PRIMARY KEY,
+    ts           REAL    NOT NULL,
+    date         TEXT    NOT NULL,
+    country      TEXT    NOT NULL,
+    slug         TEXT,
+    action       TEXT    NOT NULL,   -- created | updated | skipped | failed
+    status       TEXT    NOT NULL,   -- ok | failed
+    post_id      INTEGER,
+    http_status  INTEGER,
+    latency_ms   REAL,
+    content_hash TEXT,
+    error        TEXT,
+    source       TEXT                -- مصدر المدخل المستورد (logs.txt:<سطر>:<crc>)؛ NULL للمسجّل مباشرة
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_country_date ON attempts (country, date);
+CREATE INDEX IF NOT EXISTS idx_attempts_status_date  ON attempts (status, date);
+CREATE INDEX IF NOT EXISTS idx_attempts_date         ON attempts (date);
+CREATE INDEX IF NOT EXISTS idx_attempts_slug         ON attempts (slug);
+"""
+# بعد ترقية الجداول القديمة (عمود source أُضيف لاحقًا)
+_SOURCE_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS idx_attempts_source ON attempts (source)"
+
+_local = threading.local()
+
+
+def _connect(path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    اتصال لكل خيط (sqlite3 لا يشارك الاتصال بين الخيوط افتراضيًا)، بوضع WAL
+    ليقرأ التطبيق أثناء كتابة النشر المتوازي.
+    """
+    path = os.path.abspath(path or LEDGER_PATH)  # مفتاح مطلق: الاتصال لا يتبع ملفًا آخر بعد تغيير المجلد
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(attempts)")}
+        if "source" not in columns:
+            conn.execute("ALTER TABLE attempts ADD COLUMN source TEXT")
+        conn.execute(_SOURCE_INDEX)
+        conns[path] = conn
+    return conn
+
+
+def record(country: str, action: str, slug: Optional[str] = None, post_id: Any = None,
+           http_status: Optional[int] = None, latency_ms: Optional[float] = None,
+           content_hash: Optional[str] = None, error: Optional[str] = None,
+           day: Optional[str] = None, path: Optional[str] = None) -> int:
+    """
+    يسجّل محاولة نشر واحدة ويعيد رقمها.
+    """
+    try:
+        post_id = int(post_id) if post_id is not None else None
+    except (TypeError, ValueError):
+        post_id = None
+    conn = _connect(path)
+    with conn:
+        cur = conn.execute(
+            "INSERT INTO attempts (ts, date, country, slug, action, status, post_id, http_status,"
+            " latency_ms, content_hash, error) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+            (time.time(), day or date.today().isoformat(), country, slug, action,
+             "failed" if action == "failed" else "ok", post_id, http_status,
+             latency_ms, content_hash, error),
+        )
+    return cur.lastrowid
+
+
+def count_failures(country: Optional[str] = None, since: Optional[str] = None,
+                   until: Optional[str] = None, path: Optional[str] = None) -> int:
+    """
+    عدد المحاولات الفاشلة (مثلًا: إخفاقات العراق هذا الشهر) عبر فهرس status/date.
+    """
+    sql = "SELECT COUNT(*) FROM attempts WHERE status = 'failed'"
+    args: List[Any] = []
+    if country:
+        sql += " AND country = ?"
+        args.append(country)
+    if since:
+        sql += " AND date >= ?"
+        args.append(since)
+    if until:
+        sql += " AND date <= ?"
+        args.append(until)
+    return _connect(path).execute(sql, args).fetchone()[0]
+
+
+def post_for(country: str, day: Optional[str] = None, path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    آخر محاولة ناجحة لمقال دولة في يوم معيّن (Post ID، الـ slug، البصمة...) أو None.
+    """
+    row = _connect(path).execute(
+        "SELECT * FROM attempts WHERE country = ? AND date = ? AND status = 'ok'"
+        " ORDER BY id DESC LIMIT 1",
+        (country, day or date.today().isoformat()),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def recent(limit: int = 50, offset: int = 0, country: Optional[str] = None,
+           failed_only: bool = False, since: Optional[str] = None,
+           path: Optional[str] = None) -> List[Dict[str, Any]]:
+    sql = "SELECT * FROM attempts WHERE 1=1"
+    args: List[Any] = []
+    if country:
+        sql += " AND country = ?"
+        args.append(country)
+    if failed_only:
+        sql += " AND status = 'failed'"
+    if since:
+        sql += " AND date >= ?"
+        args.append(since)
+    sql += " ORDER BY id DESC LIMIT ? OFFSET ?"
+    args += [limit, offset]
+    return [dict(r) for r in _connect(path).execute(sql, args)]
+
+
+def summary_by_country(since: str, path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    لكل دولة منذ تاريخ: عدد المحاولات، الإخفاقات، ومتوسط زمن الاستجابة.
+    """
+    rows = _connect(path).execute(
+        "SELECT country, COUNT(*) AS attempts, SUM(status = 'failed') AS failures,"
+        " ROUND(AVG(latency_ms), 1) AS avg_latency_ms"
+        " FROM attempts WHERE date >= ? GROUP BY country ORDER BY country",
+        (since,),
+    )
+    return [dict(r) for r in rows]
+
+
+def import_logs(logs_path: str = os.path.join("data", "logs.txt"), path: Optional[str] = None) -> int:
+    """
+    يستورد أسطر logs.txt القديمة (دون slug/زمن/بصمة) ويعيد عدد المدخلات الجديدة.
+    كل سطر يحمل مفتاح مصدر فريدًا (رقمه وبصمته) مع INSERT OR IGNORE، فإعادة الاستيراد
+    لا تكرر ما سبق استيراده ولا تضخّم عدّ الإخفاقات.
+    أسطر المرآة لمحاولات مسجّلة في الدفتر أصلًا لا تُستورد: الموسومة بـ "ledger"، وغير
+    الموسومة (قبل إضافة الوسم) المؤرخة من يوم أول مدخل سجّله الدفتر مباشرة فصاعدًا.
+    """
+    from .log_tail import parse_line
+    if not os.path.exists(logs_path):
+        return 0
+    conn = _connect(path)
+    first_native = conn.execute("SELECT MIN(date) FROM attempts WHERE source IS NULL").fetchone()[0]
+    rows = []
+    with open(logs_path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.rstrip("\n")
+            e = parse_line(line)
+            if e is None or e["in_ledger"] or (first_native and e["date"] >= first_native):
+                continue
+            result = e["result"]
+            if e["failed"]:
+                action, post_id = "failed", None
+                code = result.rsplit("_", 1)[-1]
+                http_status = int(code) if code.isdigit() else None
+            else:
+                action, _, post_id = result.rpartition("_") if "_" in result else ("created", "", result)
+                http_status = None
+            rows.append((0.0, e["date"], e["country"], None, action,
+                         "failed" if e["failed"] else "ok",
+                         int(post_id) if post_id and str(post_id).isdigit() else None,
+                         http_status, None, None, "imported from logs.txt",
+                         f"logs.txt:{lineno}:{zlib.crc32(line.encode('utf-8')):08x}"))
+    with conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO attempts (ts, date, country, slug, action, status, post_id, http_status,"
+            " latency_ms, content_hash, error, source) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+            rows,
+        )
+        return conn.total_changes - before
+
+
+def _print_rows(rows: List[Dict[str, Any]]) -> None:
+    for r in rows:
+        print(f"{r['date']} | {r['country']:<8} | {r['action']:<8} | post={r['post_id']} "
+              f"| http={r['http_status']} | {r['latency_ms'] or 0:.0f}ms | {r['slug'] or ''}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Publish ledger queries")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("failures")
+    p.add_argument("--country")
+    p.add_argument("--since", default=date.today().replace(day=1).isoformat())
+    p.add_argument("--until")
+    p = sub.add_parser("post")
+    p.add_argument("--country", required=True)
+    p.add_argument("--date")
+    p = sub.add_parser("recent")
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--country")
+    p.add_argument("--failed", action="store_true")
+    sub.add_parser("import-logs")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "failures":
+        print(count_failures(args.country, args.since, args.until))
+    elif args.cmd == "post":
+        row = post_for(args.country, args.date)
+        print(row if row else "لا يوجد نشر ناجح لهذا اليوم.")
+    elif args.cmd == "recent":
+        _print_rows(recent(args.limit, country=args.country, failed_only=args.failed))
+    elif args.cmd == "import-logs":
+        print(f"imported {import_logs()} entries")
+
+
+if __name__ == "__main__":
+    main()
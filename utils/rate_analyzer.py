@@ -1,14 +1,22 @@
 # utils/rate_analyzer.py
 # يحلل تغير سعر اليوم مقابل أمس لكل دولة بالاعتماد على data/rates_history.csv
+# عبر فهرس في الذاكرة (أحدث يومين لكل دولة) يُحدَّث بقراءة الأسطر المضافة فقط.
 
 from __future__ import annotations
-import pandas as pd
-from typing import Dict
+import csv
+import io
+import os
+import threading
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
 
 # حدود حساسية الاتجاه (بالنسبة المئوية)
 UP_THRESHOLD = 0.2     # ↑ إذا زاد عن +0.2%
 DOWN_THRESHOLD = -0.2  # ↓ إذا أقل من -0.2%
 
+# صيغ تاريخ إضافية نتسامح معها إلى جانب ISO
+_DATE_FORMATS = ("%Y/%m/%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y")
+
 def _direction_from_percent(pct: float) -> str:
     if pct > UP_THRESHOLD:
         return "up"
@@ -16,52 +24,130 @@ def _direction_from_percent(pct: float) -> str:
         return "down"
     return "stable"
 
-def get_rate_change(csv_path: str, country_label: str) -> Dict[str, float | str]:
-    """
-    يحسب نسبة تغير "سعر الشراء" لعملات دولة محددة بين أحدث يوم واليوم السابق.
-    المتوقّع أن يحتوي csv على الأعمدة: [date, country, buy, sell]
+def _parse_date(s: str) -> Optional[date]:
+    s = (s or "").strip()
+    if not s:
+        return None
+    try:
+        return date.fromisoformat(s[:10])
+    except ValueError:
+        pass
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    return None
 
-    Returns:
-      {
-        "change": 0.0,           # نسبة التغير %
-        "direction": "stable",   # up | down | stable
-        "today_buy": float|None,
-        "yesterday_buy": float|None
-      }
+
+class _HistoryIndex:
+    """
+    فهرس السجل: لكل دولة أحدث يومين مميزين [(date, buy), ...] مرتبة تنازليًا.
+    - يُبطَل عند تغيّر (inode, size, mtime) للملف.
+    - إذا نما الملف فقط (إلحاق) نقرأ البايتات الجديدة من آخر إزاحة بدل إعادة البناء.
+    - إذا صغر أو استُبدل (ضغط السجل) نعيد البناء في تمريرة واحدة.
     """
-    try:
-        df = pd.read_csv(csv_path, dtype={"country": str})
-    except FileNotFoundError:
-        return {"change": 0.0, "direction": "stable", "today_buy": None, "yesterday_buy": None}
 
-    if df.empty or "country" not in df.columns:
-        return {"change": 0.0, "direction": "stable", "today_buy": None, "yesterday_buy": None}
+    def __init__(self, csv_path: str):
+        self.csv_path = csv_path
+        self._lock = threading.Lock()
+        self._sig: Optional[Tuple[int, int, int]] = None
+        self._offset = 0
+        self._columns: Dict[str, int] = {}
+        self._top: Dict[str, List[Tuple[date, str]]] = {}
 
-    # فلترة الدولة
-    d = df[df["country"] == country_label].copy()
-    if d.empty:
-        return {"change": 0.0, "direction": "stable", "today_buy": None, "yesterday_buy": None}
+    def _add(self, country: str, d: date, buy: str) -> None:
+        top = self._top.setdefault(country, [])
+        for i, (dd, _) in enumerate(top):
+            if dd == d:
+                top[i] = (d, buy)  # نفس اليوم: الإدخال الأحدث (الأخير في الملف) يفوز
+                return
+        top.append((d, buy))
+        top.sort(key=lambda e: e[0], reverse=True)
+        del top[2:]
+
+    def _consume(self, chunk: bytes) -> None:
+        text = chunk.decode("utf-8", errors="replace")
+        for rec in csv.reader(io.StringIO(text)):
+            if not rec:
+                continue
+            if not self._columns:
+                self._columns = {name.strip(): i for i, name in enumerate(rec)}
+                continue
+            ci, di, bi = (self._columns.get(k) for k in ("country", "date", "buy"))
+            if ci is None or di is None or max(ci, di) >= len(rec):
+                continue
+            d = _parse_date(rec[di])
+            if d is None:
+                continue
+            buy = rec[bi] if bi is not None and bi < len(rec) else ""
+            self._add(rec[ci], d, buy)
+
+    def refresh(self) -> bool:
+        """
+        يعيد False إذا لم يوجد الملف.
+        """
+        try:
+            st = os.stat(self.csv_path)
+        except FileNotFoundError:
+            self._sig, self._offset, self._columns, self._top = None, 0, {}, {}
+            return False
+        sig = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if sig == self._sig:
+            return True
+
+        appended = self._sig is not None and self._sig[0] == st.st_ino and st.st_size >= self._offset
+        if not appended:
+            self._offset, self._columns, self._top = 0, {}, {}
+
+        with open(self.csv_path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1  # نعالج الأسطر المكتملة فقط؛ السطر المبتور ينتظر اكتماله
+        self._consume(chunk[:end])
+        self._offset += end
+        self._sig = sig
+        return True
 
-    # تحويل التاريخ وترتيب تنازليًا
-    # نتسامح مع صيغ مختلفة للتاريخ
-    d["date"] = pd.to_datetime(d["date"], errors="coerce")
-    d = d.dropna(subset=["date"]).sort_values("date", ascending=False)
+    def entries(self, country_label: str) -> List[Tuple[date, str]]:
+        with self._lock:
+            if not self.refresh():
+                return []
+            return list(self._top.get(country_label, []))
 
-    # إزالة التكرارات لنفس اليوم (نحتفظ بأحدث إدخال)
-    d = d.drop_duplicates(subset=["date"], keep="first")
+    def entries_many(self, country_labels: Iterable[str]) -> Dict[str, List[Tuple[date, str]]]:
+        with self._lock:
+            ok = self.refresh()
+            return {c: (list(self._top.get(c, [])) if ok else []) for c in country_labels}
 
-    if len(d) < 2:
+
+_indexes: Dict[str, _HistoryIndex] = {}
+_indexes_lock = threading.Lock()
+
+def _index_for(csv_path: str) -> _HistoryIndex:
+    key = os.path.abspath(csv_path)
+    with _indexes_lock:
+        idx = _indexes.get(key)
+        if idx is None:
+            idx = _indexes[key] = _HistoryIndex(csv_path)
+        return idx
+
+def _change_from_entries(entries: List[Tuple[date, str]]) -> Dict[str, float | str]:
+    if not entries:
+        return {"change": 0.0, "direction": "stable", "today_buy": None, "yesterday_buy": None}
+
+    if len(entries) < 2:
         # لا يوجد أمس للمقارنة
-        today_buy = float(d.iloc[0]["buy"]) if "buy" in d.columns else None
+        try:
+            today_buy = float(entries[0][1])
+        except (TypeError, ValueError):
+            today_buy = None
         return {"change": 0.0, "direction": "stable", "today_buy": today_buy, "yesterday_buy": None}
 
-    today_row = d.iloc[0]
-    yest_row  = d.iloc[1]
-
     try:
-        today_buy = float(today_row["buy"])
-        yest_buy  = float(yest_row["buy"])
-    except Exception:
+        today_buy = float(entries[0][1])
+        yest_buy  = float(entries[1][1])
+    except (TypeError, ValueError):
         return {"change": 0.0, "direction": "stable", "today_buy": None, "yesterday_buy": None}
 
     if yest_buy == 0:
@@ -76,3 +162,26 @@ def get_rate_change(csv_path: str, country_label: str) -> Dict[str, float | str]
         "today_buy": today_buy,
         "yesterday_buy": yest_buy
     }
+
+def get_rate_change(csv_path: str, country_label: str) -> Dict[str, float | str]:
+    """
+    يحسب نسبة تغير "سعر الشراء" لعملات دولة محددة بين أحدث يوم واليوم السابق.
+    المتوقّع أن يحتوي csv على الأعمدة: [date, country, buy, sell]
+
+    Returns:
+      {
+        "change": 0.0,           # نسبة التغير %
+        "direction": "stable",   # up | down | stable
+        "today_buy": float|None,
+        "yesterday_buy": float|None
+      }
+    """
+    return _change_from_entries(_index_for(csv_path).entries(country_label))
+
+def get_rate_changes(csv_path: str, country_labels: Iterable[str]) -> Dict[str, Dict[str, float | str]]:
+    """
+    نسخة مجمّعة من get_rate_change: تحديث واحد للفهرس ثم حساب تغير كل الدول.
+    Returns: {country_label: <نفس قاموس get_rate_change>}
+    """
+    entries = _index_for(csv_path).entries_many(country_labels)
+    return {c: _change_from_entries(e) for c, e in entries.items()}
@@ -0,0 +1,117 @@
+# utils/rate_limit.py
+# محدِّد معدل (token bucket) مشترك بين الخيوط والعمليات لطلبات OpenAI:
+# دلوان لكل نموذج (طلبات/دقيقة RPM + توكنات تقديرية/دقيقة TPM) محفوظان في ملف محلي
+# مقفول بـ flock، فتنتظر الطلبات دورها قبل أن يرفضها الخادم بدل التذبذب بين الاندفاع والـ backoff.
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+try:
+    import fcntl  # قفل بين العمليات (غير متوفر على ويندوز → قفل داخل العملية فقط)
+except ImportError:
+    fcntl = None
+
+STATE_DIR = os.getenv("LLM_RATE_LIMIT_DIR", os.path.join("data", "ratelimit"))
+
+# {"gpt-5": {"rpm": 500, "tpm": 500000}, "default": {...}} — نموذج بلا حدود = بلا انتظار
+LIMITS: Dict[str, Dict[str, float]] = {}
+CHARS_PER_TOKEN = 3.0          # تقدير تقريبي للنص العربي
+EXPECTED_OUTPUT_TOKENS = 800   # يُضاف لتقدير توكنات الرد
+
+_thread_lock = threading.Lock()
+
+
+def configure_rate_limits(conf: Optional[Dict[str, Any]] = None) -> None:
+    """
+    يضبط الحدود من config["rate_limits"]:
+      {"state_dir": "data/ratelimit", "expected_output_tokens": 800,
+       "models": {"gpt-5": {"rpm": 500, "tpm": 500000}, "default": {"rpm": 60, "tpm": 100000}}}
+    """
+    global STATE_DIR, EXPECTED_OUTPUT_TOKENS
+    conf = conf or {}
+    if "state_dir" in conf:
+        STATE_DIR = conf["state_dir"]
+    if "expected_output_tokens" in conf:
+        EXPECTED_OUTPUT_TOKENS = int(conf["expected_output_tokens"])
+    LIMITS.clear()
+    for model, lim in (conf.get("models") or {}).items():
+        LIMITS[model] = {"rpm": float(lim.get("rpm", 0)), "tpm": float(lim.get("tpm", 0))}
+
+
+def estimate_tokens(prompt: str, expected_output: Optional[int] = None) -> int:
+    out = EXPECTED_OUTPUT_TOKENS if expected_output is None else expected_output
+    return int(len(prompt) / CHARS_PER_TOKEN) + out
+
+
+def _limits_for(model: str) -> Optional[Dict[str, float]]:
+    return LIMITS.get(model) or LIMITS.get("default")
+
+
+def _state_path(model: str) -> str:
+    safe = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in model)
+    return os.path.join(STATE_DIR, f"{safe}.json")
+
+
+def _try_take(path: str, lim: Dict[str, float], tokens: float) -> float:
+    """
+    يأخذ طلبًا واحدًا + tokens من الدلوين إن توفّرا ويعيد 0، وإلا يعيد زمن الانتظار المقدّر.
+    يُستدعى تحت القفل (خيوط + flock).
+    """
+    now = time.time()
+    rpm, tpm = lim["rpm"], lim["tpm"]
+    with open(path, "a+", encoding="utf-8") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or "{}")
+            except ValueError:
+                state = {}
+            elapsed = max(0.0, now - state.get("updated", now))
+            req_tokens = min(rpm, state.get("requests", rpm) + elapsed * rpm / 60.0) if rpm else 0.0
+            tok_tokens = min(tpm, state.get("tokens", tpm) + elapsed * tpm / 60.0) if tpm else 0.0
+
+            need_req = 1.0 if rpm else 0.0
+            need_tok = min(tokens, tpm) if tpm else 0.0  # طلب أكبر من السعة ينتظر امتلاء الدلو فقط
+            wait = 0.0
+            if rpm and req_tokens < need_req:
+                wait = max(wait, (need_req - req_tokens) * 60.0 / rpm)
+            if tpm and tok_tokens < need_tok:
+                wait = max(wait, (need_tok - tok_tokens) * 60.0 / tpm)
+            if wait == 0.0:
+                req_tokens -= need_req
+                tok_tokens -= need_tok
+
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps({"requests": req_tokens, "tokens": tok_tokens, "updated": now}))
+            f.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    return wait
+
+
+def acquire(model: str, tokens: int = 0, timeout: Optional[float] = None) -> float:
+    """
+    ينتظر حتى يتوفر طلب واحد + tokens ضمن حصة النموذج، ويعيد زمن الانتظار الفعلي.
+    نموذج بلا حدود مضبوطة يمرّ فورًا. يرفع TimeoutError إذا تجاوز الانتظار timeout.
+    """
+    lim = _limits_for(model)
+    if not lim or not (lim.get("rpm") or lim.get("tpm")):
+        return 0.0
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = _state_path(model)
+    start = time.time()
+    while True:
+        with _thread_lock:
+            wait = _try_take(path, lim, tokens)
+        if wait <= 0:
+            return time.time() - start
+        if timeout is not None and time.time() - start + wait > timeout:
+            raise TimeoutError(f"تجاوز انتظار حصة {model} المهلة ({timeout}s).")
+        time.sleep(min(wait, 5.0))
@@ -0,0 +1,79 @@
+# utils/rate_snapshot.py
+# لقطة أسعار مشتركة من exchangerate.host: طلب واحد بكل العملات (symbols=JOD,IQD,...)
+# لكل تشغيل، وكل مصدر دولة يأخذ قيمته من اللقطة بدل طلب مستقل لكل عملة.
+# المصادر (jordan/iraq/lebanon/syria) تستدعي get_usd_rate فقط؛ الرابط ومدة الصلاحية هنا وحدها.
+
+import threading
+import time
+from typing import Dict, Optional
+
+from .http_utils import http_get
+
+API_URL = "https://api.exchangerate.host/latest"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; CurrencyReporter/1.0; +https://example.com)"
+}
+TIMEOUT = 12
+
+# العملات التي تُطلب دائمًا في اللقطة (تُضاف إليها أي عملة تُطلب لاحقًا)
+SYMBOLS = ["JOD", "IQD", "LBP", "SYP", "EGP"]
+
+SNAPSHOT_TTL = 600       # ثوانٍ قبل اعتبار اللقطة قديمة
+FAILURE_TTL = 60         # لا نعيد المحاولة بعد فشل قبل هذه المدة
+
+_lock = threading.Lock()
+_rates: Dict[str, float] = {}
+_fetched_symbols = set()
+_fetched_at = 0.0
+_failed_at = 0.0
+
+
+def _fetch(symbols) -> Optional[Dict[str, float]]:
+    params = {"base": "USD", "symbols": ",".join(symbols)}
+    r = http_get(API_URL, params=params, headers=HEADERS, timeout=TIMEOUT)
+    if r.status_code != 200:
+        return None
+    rates = r.json().get("rates", {})
+    if not isinstance(rates, dict):
+        return None
+    return {k: float(v) for k, v in rates.items() if isinstance(v, (int, float)) and v > 0}
+
+
+def get_snapshot(force_refresh: bool = False, extra_symbols=()) -> Dict[str, float]:
+    """
+    يعيد {"JOD": 0.709, ...} من لقطة واحدة مشتركة.
+    - الطلب يتم مرة واحدة ضمن SNAPSHOT_TTL مهما تعدد المستدعون (حتى بالتوازي).
+    - عند الفشل نعيد ما لدينا (قد يكون فارغًا) ولا نعيد المحاولة قبل FAILURE_TTL.
+    """
+    global _rates, _fetched_symbols, _fetched_at, _failed_at
+    with _lock:
+        for s in extra_symbols:
+            if s not in SYMBOLS:
+                SYMBOLS.append(s)
+        now = time.time()
+        missing = any(s not in _fetched_symbols for s in extra_symbols)
+        fresh = _fetched_symbols and (now - _fetched_at) < SNAPSHOT_TTL and not missing
+        if fresh and not force_refresh:
+            return dict(_rates)
+        if not force_refresh and (now - _failed_at) < FAILURE_TTL:
+            return dict(_rates)
+        symbols = list(SYMBOLS)
+        try:
+            rates = _fetch(symbols)
+        except Exception:
+            rates = None
+        if rates:
+            _rates = rates
+            _fetched_symbols = set(symbols)
+            _fetched_at = now
+        else:
+            _failed_at = now
+        return dict(_rates)
+
+
+def get_usd_rate(symbol: str) -> Optional[float]:
+    """
+    سعر USD→symbol من اللقطة المشتركة، أو None إن لم يتوفر.
+    """
+    symbol = symbol.upper()
+    return get_snapshot(extra_symbols=(symbol,)).get(symbol)
@@ -0,0 +1,72 @@
+# utils/startup_report.py
+# تقرير زمن الإقلاع على غرار `python -X importtime`: يشغّل استيراد الوحدة في عملية نظيفة،
+# يعرض أثقل الاستيرادات، ويفشل (exit 1) إذا تجاوز الزمن الكلي الميزانية المحددة.
+#
+# الاستخدام:
+#   python -m utils.startup_report                    # generator بميزانية 500ms
+#   python -m utils.startup_report --module app --budget-ms 800 --top 20
+
+import argparse
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S.*)$")
+
+
+def measure_imports(module: str = "generator") -> Tuple[int, List[Tuple[str, int, int, int]]]:
+    """
+    يستورد الوحدة في مفسّر جديد مع -X importtime.
+    Returns:
+      (cumulative_us للوحدة الهدف, [(name, self_us, cumulative_us, depth), ...])
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"فشل استيراد {module}:\n{proc.stderr.strip()[-2000:]}")
+
+    rows = []
+    total = 0
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        self_us, cum_us, indent, name = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4).strip()
+        depth = max(0, (len(indent) - 1) // 2)
+        rows.append((name, self_us, cum_us, depth))
+        if name == module:
+            total = cum_us
+    return total, rows
+
+
+def report(module: str = "generator", budget_ms: float = 500.0, top: int = 15) -> bool:
+    total_us, rows = measure_imports(module)
+    by_package: Dict[str, int] = {}
+    for name, self_us, _, _ in rows:
+        root = name.split(".")[0]
+        by_package[root] = by_package.get(root, 0) + self_us
+
+    print(f"⏱️ زمن استيراد {module}: {total_us / 1000:.1f} ms (الميزانية {budget_ms:.0f} ms)")
+    print("\nأثقل الحزم (مجموع self):")
+    for root, us in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        print(f"  {us / 1000:8.1f} ms  {root}")
+
+    ok = total_us / 1000 <= budget_ms
+    print("\n✅ ضمن الميزانية" if ok else "\n❌ تجاوز ميزانية الإقلاع")
+    return ok
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Cold-start import time report")
+    ap.add_argument("--module", default="generator")
+    ap.add_argument("--budget-ms", type=float, default=500.0)
+    ap.add_argument("--top", type=int, default=15)
+    args = ap.parse_args(argv)
+    sys.exit(0 if report(args.module, args.budget_ms, args.top) else 1)
+
+
+if __name__ == "__main__":
+    main()
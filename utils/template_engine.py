@@ -0,0 +1,120 @@
+# utils/template_engine.py
+# محرك قوالب حتمي بلا نموذج لغوي: يبني المقال بفقراته الخمس كما يصفها build_prompt
+# (السعر الرسمي، المقارنة بالأمس، السوق الموازية، السياسة النقدية، الخاتمة) من
+# rate/change مباشرة، بعبارات مأخوذة من بنك صياغات كل دولة في config/prompts.json
+# ومن تنويعات text_utils. الاختيار بين الصياغات ثابت لكل (دولة، تاريخ) فيتكرر الناتج
+# نفسه عند إعادة التشغيل. زمن التوليد أقل من ملي ثانية؛ يُستخدم وضعًا مستقلًا أو بديلًا
+# تلقائيًا عند تجاوز مهلة النموذج.
+
+import zlib
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from .text_utils import OPENING_VARIANTS, TRANSITIONS
+
+# بنك الصياغات الافتراضي؛ مفاتيح "phrases" في prompts.json لكل دولة تتقدّم عليه
+DEFAULT_PHRASES: Dict[str, Any] = {
+    "reasons": {
+        "up": [
+            "في ظل زيادة الطلب على العملة الأمريكية لتغطية الواردات",
+            "مع تراجع نسبي في المعروض الدولاري لدى البنوك",
+        ],
+        "down": [
+            "مع تحسّن تدفقات النقد الأجنبي إلى القطاع المصرفي",
+            "في ظل تراجع الطلب التجاري على الدولار خلال الأيام الأخيرة",
+        ],
+        "stable": [
+            "في ظل توازن نسبي بين العرض والطلب داخل القطاع المصرفي",
+            "مع استمرار وفرة السيولة الدولارية لدى البنوك",
+        ],
+    },
+    "parallel": [
+        "أما في السوق الموازية، فتشير تقديرات متعاملين إلى تحركات محدودة لا تبتعد كثيرًا عن المستويات الرسمية.",
+        "وعلى صعيد السوق غير الرسمية، يتحدث مراقبون عن تعاملات هادئة دون قفزات لافتة.",
+    ],
+    "policy": [
+        "ويتابع البنك المركزي هذه التحركات عن كثب، إذ ينعكس سعر الصرف مباشرة على كلفة الواردات ومعدلات التضخم.",
+        "وتبقى أدوات السياسة النقدية حاضرة لضبط السيولة إذا اتسعت الضغوط على العملة المحلية.",
+    ],
+    "watch": [
+        "وخلال الساعات الثماني والأربعين المقبلة، يراقب المتعاملون مستويات السيولة وأي إشارات جديدة بشأن أسعار الفائدة.",
+        "ويترقب السوق خلال اليومين المقبلين حجم التدفقات الدولارية وتحركات أسعار النفط عالميًا.",
+    ],
+}
+
+_DIRECTION_TEXT = {
+    "up": "ارتفع السعر بنسبة {pct}% مقارنة بتعاملات الأمس",
+    "down": "تراجع السعر بنسبة {pct}% مقارنة بتعاملات الأمس",
+    "stable": "حافظ السعر على مستواه تقريبًا مقارنة بتعاملات الأمس",
+}
+
+
+def _pick(options: List[str], key: str) -> str:
+    """
+    اختيار ثابت لكل مفتاح (دولة|تاريخ|خانة) دون حالة مشتركة بين الخيوط.
+    """
+    return options[zlib.crc32(key.encode("utf-8")) % len(options)]
+
+
+def phrase_bank(country_prompts: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    custom = (country_prompts or {}).get("phrases") or {}
+    bank = dict(DEFAULT_PHRASES)
+    for k, v in custom.items():
+        if k == "reasons":
+            bank["reasons"] = {**DEFAULT_PHRASES["reasons"], **v}
+        elif v:
+            bank[k] = v
+    return bank
+
+
+def render_article(rate: Dict[str, Any], change: Dict[str, Any], country_code: str,
+                   country_prompts: Optional[Dict[str, Any]] = None,
+                   today: Optional[str] = None) -> str:
+    """
+    يعيد المقال Markdown بخمس فقرات مفصولة بسطر فارغ.
+    """
+    today = today or date.today().isoformat()
+    bank = phrase_bank(country_prompts)
+    key = f"{country_code}|{today}"
+    country = rate["country"]
+    currency = rate["currency"]
+    src = rate.get("source") or "مصدر رسمي"
+    direction = change.get("direction", "stable")
+    if direction not in _DIRECTION_TEXT:
+        direction = "stable"
+    pct = abs(float(change.get("change", 0) or 0))
+
+    opening = (
+        f"{_pick(OPENING_VARIANTS, key + '|open')} في {country}، إذ سجّل السعر الرسمي للشراء "
+        f"{rate['buy']} {currency} وللبيع {rate['sell']} {currency}، بحسب بيانات {src}."
+    )
+    comparison = (
+        f"{_pick(TRANSITIONS, key + '|tr')} {_DIRECTION_TEXT[direction].format(pct=pct)}، "
+        f"{_pick(bank['reasons'][direction], key + '|reason')}."
+    )
+    parallel = _pick(bank["parallel"], key + "|parallel")
+    focus = (country_prompts or {}).get("focus")
+    policy = _pick(bank["policy"], key + "|policy")
+    if focus:
+        policy += f" ويبقى التركيز منصبًّا على {focus}."
+    closing = _pick(bank["watch"], key + "|watch")
+    return "\n\n".join((opening, comparison, parallel, policy, closing))
+
+
+def render_meta(rate: Dict[str, Any], today: Optional[str] = None) -> Tuple[str, str]:
+    """
+    (title, desc) بنفس قواعد اختيار meta_utils لكن دون استدعاء النموذج.
+    """
+    from .meta_utils import select_meta
+    today = today or date.today().isoformat()
+    country = rate["country"]
+    data = {
+        "titles": [
+            f"سعر الدولار اليوم في {country}: شراء {rate['buy']} وبيع {rate['sell']}",
+            f"سعر الدولار اليوم في {country} {today}",
+        ],
+        "descriptions": [
+            f"سعر الدولار مقابل {rate['currency']} اليوم {today}: {rate['buy']} للشراء و{rate['sell']} للبيع وفق البيانات الرسمية.",
+        ],
+    }
+    return select_meta(data, country, today, rate["currency"])
@@ -1,9 +1,14 @@
 # utils/text_utils.py
 # وظائف "بشرنة" النص الناتج من النموذج: إزالة التكرار، تدوير افتتاحيات،
 # إدخال وصلات لغوية بشرية، وضبط الطول ضمن حدود مستهدفة.
+# Humanizer يجمّع الأنماط مرة واحدة ويحتفظ بحالة التدوير لكل مفتاح (دولة) تحت قفل،
+# فيصلح للاستخدام المتزامن داخل خط التشغيل؛ humanize() واجهة متوافقة فوق نسخة افتراضية.
 
 import re
-from typing import List
+import threading
+import zlib
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence
 
 # افتتاحيات شائعة سنستبدلها بتدوير تنويعات مرادفة
 OPENING_PATTERNS: List[str] = [
@@ -42,107 +47,139 @@ GENERIC_FILLERS: List[str] = [
 ]
 
 
-_open_idx = 0  # مؤشر تدوير الافتتاحيات
-
-
-def _normalize_whitespace(text: str) -> str:
-    # أسطر مزدوجة → سطرين كحد أقصى، مسافات متعددة → مسافة واحدة
-    t = re.sub(r"[ \t]+", " ", text)
-    t = re.sub(r"\n{3,}", "\n\n", t)
-    return t.strip()
-
-
-def _rotate_opening_once(text: str) -> str:
+class Humanizer:
     """
-    يستبدل أول افتتاحية نمطية ببديل بشري من القائمة.
-    لا يكرر الاستبدال داخل النص، فقط أول تطابق في البداية.
+    محرك بشرنة مُجمَّع مسبقًا وآمن للخيوط. حالة تدوير الافتتاحيات لكل key
+    (مثل رمز الدولة) مستقلة، فلا تتأثر دولة بترتيب معالجة الدول الأخرى.
     """
-    global _open_idx
-    for pat in OPENING_PATTERNS:
-        m = re.search(pat, text, flags=re.U | re.M)
-        if m and m.start() == 0:
-            replacement = OPENING_VARIANTS[_open_idx % len(OPENING_VARIANTS)]
-            _open_idx += 1
-            # استبدل بداية السطر فقط
-            text = re.sub(pat, replacement, text, count=1, flags=re.U | re.M)
-            break
-    return text
-
-
-def _ensure_transition(text: str) -> str:
-    """
-    إن لم نجد وصلة انتقالية بشرية داخل النص، نضيف واحدة بعد أول فقرة.
-    """
-    if any(tr in text for tr in TRANSITIONS):
-        return text
 
-    # إدراج انتقال بعد أول سطر/فقرة
-    parts = re.split(r"\n\s*\n", text, maxsplit=1)
-    if len(parts) == 2:
-        return parts[0] + "\n\n" + TRANSITIONS[0] + " " + parts[1]
-    else:
+    # أنماط ببادئة حرفية ثابتة يبحث عنها re بسرعة بدل فحص كل مسافة في النص
+    _SPACES_RE = re.compile(r"  +")
+    _BLANK_LINES_RE = re.compile(r"\n\n\n+")
+    _PARA_RE = re.compile(r"\n\s*\n")
+    _SUFFIX = (
+        " وبشكل عام، تبدو حركة الصرف مرهونة بتطورات السيولة وقرارات السياسة النقدية "
+        "خلال اليومين المقبلين، مع متابعة حذرة من المتعاملين."
+    )
+
+    def __init__(self,
+                 opening_patterns: Sequence[str] = OPENING_PATTERNS,
+                 opening_variants: Sequence[str] = OPENING_VARIANTS,
+                 transitions: Sequence[str] = TRANSITIONS,
+                 fillers: Sequence[str] = GENERIC_FILLERS):
+        self.opening_variants = list(opening_variants)
+        self.transitions = list(transitions)
+        # الأنماط تبدأ بـ ^\s* ؛ نجمعها في نمط واحد مثبّت على بداية النص
+        prefix = r"^\s*"
+        bodies = [p[len(prefix):] if p.startswith(prefix) else p for p in opening_patterns]
+        self._opening_re = re.compile(r"\A\s*(?:" + "|".join(bodies) + ")", re.U)
+        self._transition_re = re.compile("|".join(re.escape(t) for t in self.transitions))
+        self._filler_re = re.compile("|".join(fillers))
+        self._lock = threading.Lock()
+        self._open_idx: Dict[Optional[str], int] = {}
+
+    def _next_variant(self, key: Optional[str]) -> str:
+        """
+        أول افتتاحية لكل key تُشتق من crc32(key|تاريخ اليوم) كما في template_engine،
+        فيختلف الافتتاح بين الدول ومن يوم لآخر حتى في تشغيل ليلي يعالج كل دولة مرة واحدة.
+        """
+        with self._lock:
+            i = self._open_idx.get(key)
+            if i is None:
+                i = 0 if key is None else zlib.crc32(f"{key}|{date.today().isoformat()}".encode("utf-8"))
+            self._open_idx[key] = i + 1
+        return self.opening_variants[i % len(self.opening_variants)]
+
+    def normalize_whitespace(self, text: str) -> str:
+        # كل خطوة تُنفَّذ فقط إذا وُجد ما تصلحه (فحص نصي سريع)؛ النص النظيف لا يمر على regex
+        if "\t" in text:
+            text = text.replace("\t", " ")
+        if "  " in text:
+            text = self._SPACES_RE.sub(" ", text)
+        if "\n\n\n" in text:
+            text = self._BLANK_LINES_RE.sub("\n\n", text)
+        return text.strip()
+
+    def rotate_opening(self, text: str, key: Optional[str] = None) -> str:
+        """
+        يستبدل الافتتاحية النمطية في بداية النص فقط ببديل بشري من القائمة.
+        """
+        m = self._opening_re.match(text)
+        if not m:
+            return text
+        return self._next_variant(key) + text[m.end():]
+
+    def ensure_transition(self, text: str) -> str:
+        """
+        إن لم نجد وصلة انتقالية بشرية داخل النص، نضيف واحدة بعد أول فقرة.
+        """
+        if self._transition_re.search(text):
+            return text
+        parts = self._PARA_RE.split(text, maxsplit=1)
+        if len(parts) == 2:
+            return parts[0] + "\n\n" + self.transitions[0] + " " + parts[1]
         # لا توجد فقرات؛ أضف انتقالًا في منتصف النص تقريبًا
         words = text.split()
         if len(words) > 40:
             mid = len(words) // 2
-            return " ".join(words[:mid] + [TRANSITIONS[0]] + words[mid:])
+            return " ".join(words[:mid] + [self.transitions[0]] + words[mid:])
         return text
 
+    def strip_generic_fillers(self, text: str) -> str:
+        return self.normalize_whitespace(self._filler_re.sub("", text))
+
+    def soft_clamp_length(self, text: str, min_words: int, max_words: int) -> str:
+        """
+        إذا تجاوز النص الحد الأعلى، نحاول أولاً إزالة الحشو العام،
+        ثم نقصّ بأمان عند آخر علامة ترقيم. وإذا كان أقصر من الحد الأدنى نعزّز الخاتمة.
+        """
+        n = len(text.split())
+        if n > max_words:
+            t = self.strip_generic_fillers(text)
+            words2 = t.split()
+            if len(words2) <= max_words:
+                return t
+            preview = " ".join(words2[:max_words + 20])
+            end_idx = max(preview.rfind("."), preview.rfind("!"), preview.rfind("؟"))
+            if end_idx >= 0:
+                return preview[:end_idx].strip()
+            return " ".join(words2[:max_words]).strip()
+        if n < min_words:
+            return (text.rstrip() + " " + self._SUFFIX).strip()
+        return text
 
-def _strip_generic_fillers(text: str) -> str:
-    for pat in GENERIC_FILLERS:
-        text = re.sub(pat, "", text)
-    # تنظيف مسافات ناتجة
-    return _normalize_whitespace(text)
-
+    def humanize(self, text: str, min_words: int = 140, max_words: int = 220,
+                 key: Optional[str] = None) -> str:
+        """
+        تنظّف النص، تدوّر الافتتاحية (حسب key)، تضيف وصلة انتقالية عند الحاجة،
+        وتضمن الطول المستهدف. لا تغيّر المعنى الاقتصادي؛ فقط تحسينات أسلوبية.
+        """
+        t = self.normalize_whitespace(text)
+        t = self.rotate_opening(t, key)
+        t = self.ensure_transition(t)
+        t = self.soft_clamp_length(t, min_words, max_words)
+        return self.normalize_whitespace(t)
 
-def _soft_clamp_length(text: str, min_words: int, max_words: int) -> str:
-    """
-    إذا تجاوز النص الحد الأعلى، نحاول أولاً إزالة الحشو العام،
-    ثم نقصّ بأمان عند حدود الجملة/الكلمة.
-    وإذا كان أقصر من الحد الأدنى، نحاول تعزيز الخاتمة بجملة موجزة.
-    """
-    words = text.split()
-    n = len(words)
-
-    if n > max_words:
-        # جرّب إزالة الحشو
-        t = _strip_generic_fillers(text)
-        words2 = t.split()
-        if len(words2) <= max_words:
-            return t
-
-        # قصّ آمن: حاول عند علامة ترقيم قبل max_words + 20
-        preview = " ".join(words2[:max_words + 20])
-        # ابحث عن أقرب فاصلة/نقطة/تعجب/استفهام للقص
-        cut = re.search(r"[\.!\؟]\s*[^\.\!\؟]*$", preview)
-        if cut:
-            # قص عند آخر نقطة ضمن المعاينة
-            end_idx = cut.start()
-            return preview[:end_idx].strip()
-        else:
-            return " ".join(words2[:max_words]).strip()
+    def humanize_many(self, texts: Iterable[str], min_words: int = 140, max_words: int = 220,
+                      keys: Optional[Iterable[Optional[str]]] = None) -> List[str]:
+        """
+        بشرنة دفعة نصوص بنفس الأنماط المجمّعة؛ keys (اختياري) بنفس ترتيب texts.
+        """
+        texts = list(texts)
+        keys = list(keys) if keys is not None else [None] * len(texts)
+        return [self.humanize(t, min_words, max_words, k) for t, k in zip(texts, keys)]
 
-    if n < min_words:
-        # عزّز بخاتمة قصيرة بشرية
-        suffix = (
-            " وبشكل عام، تبدو حركة الصرف مرهونة بتطورات السيولة وقرارات السياسة النقدية "
-            "خلال اليومين المقبلين، مع متابعة حذرة من المتعاملين."
-        )
-        return (text.rstrip() + " " + suffix).strip()
 
-    return text
+_default = Humanizer()
 
 
-def humanize(text: str, min_words: int = 140, max_words: int = 220) -> str:
+def humanize(text: str, min_words: int = 140, max_words: int = 220, key: Optional[str] = None) -> str:
     """
-    الواجهة الرئيسية: تنظّف النص، تدوّر الافتتاحية، تضيف وصلة انتقالية عند الحاجة،
-    وتضمن الطول المستهدف. لا تغيّر المعنى الاقتصادي؛ فقط تحسينات أسلوبية.
+    الواجهة الرئيسية (متوافقة مع الاستدعاءات السابقة) فوق Humanizer افتراضي مشترك.
     """
-    t = _normalize_whitespace(text)
-    t = _rotate_opening_once(t)
-    t = _ensure_transition(t)
-    t = _soft_clamp_length(t, min_words, max_words)
-    # تنظيف نهائي للمسافات المزدوجة
-    t = _normalize_whitespace(t)
-    return t
+    return _default.humanize(text, min_words, max_words, key)
+
+
+def humanize_many(texts: Iterable[str], min_words: int = 140, max_words: int = 220,
+                  keys: Optional[Iterable[Optional[str]]] = None) -> List[str]:
+    return _default.humanize_many(texts, min_words, max_words, keys)
@@ -0,0 +1,245 @@
+# utils/tracing.py
+# قياس زمني خفيف لكل مرحلة ولكل دولة (span): المدة، عدد إعادة المحاولات، والنتيجة.
+# في نهاية التشغيل تُصدَّر الـ spans إلى data/traces/<run>.jsonl وإلى ملف Prometheus
+# نصي (metrics.prom) يلتقطه node_exporter textfile collector، ويلخّص الأمر أدناه
+# p50/p95 لكل مرحلة عبر كل التشغيلات لمعرفة أي مرحلة تستحق التحسين أولًا.
+#
+# الاستخدام:
+#   python -m utils.tracing summary                 # كل التشغيلات المحفوظة
+#   python -m utils.tracing summary --last 7 --by-country
+
+import argparse
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+ENABLED = False  # يُفعَّل من config["tracing"] في التشغيل الليلي؛ بدونه span لا يسجّل شيئًا
+TRACE_DIR = os.path.join("data", "traces")
+PROM_FILE = "metrics.prom"
+# حدود مدرّج Prometheus بالثواني (من جلب محلي سريع إلى استدعاء نموذج طويل)
+# نتائج تُعدّ أخطاء في الملخص ("failed" من traces قديمة سُجّل فيها فشل النشر بهذا الاسم)
+ERROR_OUTCOMES = ("error", "failed")
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_spans: List[Dict[str, Any]] = []
+_lock = threading.Lock()
+_run_id = time.strftime("%Y%m%d-%H%M%S")
+_current: contextvars.ContextVar = contextvars.ContextVar("tracing_span", default=None)
+
+
+class Span:
+    __slots__ = ("stage", "country", "retries", "outcome", "attrs")
+
+    def __init__(self, stage: str, country: Optional[str]):
+        self.stage = stage
+        self.country = country
+        self.retries = 0
+        self.outcome = "ok"
+        self.attrs: Dict[str, Any] = {}
+
+
+def configure(conf: Optional[Dict[str, Any]] = None) -> None:
+    """
+    conf = config["tracing"]: {"enabled": true, "dir": "data/traces"}
+    """
+    global ENABLED, TRACE_DIR, _run_id
+    conf = conf or {}
+    ENABLED = bool(conf.get("enabled", False))
+    TRACE_DIR = conf.get("dir", TRACE_DIR)
+    _run_id = time.strftime("%Y%m%d-%H%M%S")
+    with _lock:
+        _spans.clear()
+
+
+@contextmanager
+def span(stage: str, country: Optional[str] = None) -> Iterator[Optional[Span]]:
+    """
+    with span("fetch", "egypt") as s: ...  — استثناء داخل الكتلة يُسجَّل outcome="error" ثم يُعاد رفعه.
+    الدولة تُورَّث من الـ span الأب إن لم تُمرَّر.
+    """
+    if not ENABLED:
+        yield None
+        return
+    parent = _current.get()
+    if country is None and parent is not None:
+        country = parent.country
+    s = Span(stage, country)
+    token = _current.set(s)
+    start = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.outcome = "error"
+        s.attrs.setdefault("error", f"{type(e).__name__}: {e}"[:300])
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current.reset(token)
+        rec = {"run": _run_id, "ts": time.time(), "stage": stage, "country": country,
+               "duration_ms": round(duration * 1000.0, 3), "retries": s.retries, "outcome": s.outcome}
+        if s.attrs:
+            rec["attrs"] = s.attrs
+        with _lock:
+            _spans.append(rec)
+
+
+def note_retry(n: int = 1) -> None:
+    """
+    تُستدعى من داخل مرحلة (مثل call_llm) عند كل إعادة محاولة.
+    """
+    s = _current.get()
+    if s is not None:
+        s.retries += n
+
+
+def set_outcome(outcome: str, **attrs: Any) -> None:
+    s = _current.get()
+    if s is not None:
+        s.outcome = outcome
+        s.attrs.update(attrs)
+
+
+def wrap(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    ينقل سياق الـ span الحالي إلى خيط آخر (ThreadPoolExecutor لا ينسخ contextvars).
+    """
+    ctx = contextvars.copy_context()
+    return lambda *a, **kw: ctx.run(fn, *a, **kw)
+
+
+def spans() -> List[Dict[str, Any]]:
+    with _lock:
+        return list(_spans)
+
+
+# ---------- التصدير ----------
+def _percentile(sorted_vals: List[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * p
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def _prometheus_text(records: List[Dict[str, Any]]) -> str:
+    by_stage: Dict[str, List[Dict[str, Any]]] = {}
+    for r in records:
+        by_stage.setdefault(r["stage"], []).append(r)
+    lines = [
+        "# HELP currency_reporter_stage_duration_seconds Duration of pipeline stages in the last run.",
+        "# TYPE currency_reporter_stage_duration_seconds histogram",
+    ]
+    for stage, recs in sorted(by_stage.items()):
+        secs = [r["duration_ms"] / 1000.0 for r in recs]
+        for le in BUCKETS:
+            lines.append(f'currency_reporter_stage_duration_seconds_bucket{{stage="{stage}",le="{le}"}} '
+                         f'{sum(1 for d in secs if d <= le)}')
+        lines.append(f'currency_reporter_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {len(secs)}')
+        lines.append(f'currency_reporter_stage_duration_seconds_sum{{stage="{stage}"}} {sum(secs):.6f}')
+        lines.append(f'currency_reporter_stage_duration_seconds_count{{stage="{stage}"}} {len(secs)}')
+    lines += [
+        "# HELP currency_reporter_stage_retries_total Retries inside pipeline stages in the last run.",
+        "# TYPE currency_reporter_stage_retries_total counter",
+    ]
+    for stage, recs in sorted(by_stage.items()):
+        lines.append(f'currency_reporter_stage_retries_total{{stage="{stage}"}} {sum(r["retries"] for r in recs)}')
+    lines += [
+        "# HELP currency_reporter_stage_outcomes_total Stage outcomes in the last run.",
+        "# TYPE currency_reporter_stage_outcomes_total counter",
+    ]
+    for stage, recs in sorted(by_stage.items()):
+        counts: Dict[str, int] = {}
+        for r in recs:
+            counts[r["outcome"]] = counts.get(r["outcome"], 0) + 1
+        for outcome, n in sorted(counts.items()):
+            lines.append(f'currency_reporter_stage_outcomes_total{{stage="{stage}",outcome="{outcome}"}} {n}')
+    return "\n".join(lines) + "\n"
+
+
+def export(directory: Optional[str] = None) -> Optional[str]:
+    """
+    يكتب spans هذا التشغيل إلى <dir>/<run>.jsonl ويستبدل <dir>/metrics.prom ذريًا.
+    يعيد مسار ملف الـ JSONL (أو None إذا لم يُسجَّل شيء).
+    """
+    records = spans()
+    if not records:
+        return None
+    directory = directory or TRACE_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{_run_id}.jsonl")
+    with open(path, "a", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    prom_path = os.path.join(directory, PROM_FILE)
+    with open(prom_path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(_prometheus_text(records))
+    os.replace(prom_path + ".tmp", prom_path)
+    return path
+
+
+# ---------- الملخص ----------
+def load_traces(directory: Optional[str] = None, last: Optional[int] = None) -> List[Dict[str, Any]]:
+    files = sorted(glob.glob(os.path.join(directory or TRACE_DIR, "*.jsonl")))
+    if last:
+        files = files[-last:]
+    out: List[Dict[str, Any]] = []
+    for path in files:
+        with open(path, encoding="utf-8") as f:
+            out.extend(json.loads(line) for line in f if line.strip())
+    return out
+
+
+def summarize(records: List[Dict[str, Any]], by_country: bool = False) -> List[Dict[str, Any]]:
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for r in records:
+        key = (r["stage"], r.get("country") or "-") if by_country else (r["stage"],)
+        groups.setdefault(key, []).append(r)
+    rows = []
+    for key, recs in groups.items():
+        d = sorted(r["duration_ms"] for r in recs)
+        rows.append({
+            "stage": key[0],
+            "country": key[1] if by_country else None,
+            "count": len(d),
+            "p50_ms": _percentile(d, 0.50),
+            "p95_ms": _percentile(d, 0.95),
+            "max_ms": d[-1],
+            "total_ms": sum(d),
+            "retries": sum(r["retries"] for r in recs),
+            "errors": sum(1 for r in recs if r["outcome"] in ERROR_OUTCOMES),
+        })
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)  # الأعلى كلفة إجمالية أولًا
+    return rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pipeline stage timing summary (p50/p95 across runs)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("summary")
+    p.add_argument("--dir", default=TRACE_DIR)
+    p.add_argument("--last", type=int, help="آخر N تشغيلات فقط")
+    p.add_argument("--by-country", action="store_true")
+    args = ap.parse_args(argv)
+
+    records = load_traces(args.dir, args.last)
+    if not records:
+        print("لا توجد traces بعد.")
+        return
+    runs = len({r["run"] for r in records})
+    print(f"{len(records)} spans across {runs} run(s)")
+    head = f"{'stage':<16}{'country':<10}" if args.by_country else f"{'stage':<16}"
+    print(f"{head}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'max ms':>11}{'total s':>10}{'retries':>9}{'errors':>8}")
+    for r in summarize(records, args.by_country):
+        lead = f"{r['stage']:<16}{r['country']:<10}" if args.by_country else f"{r['stage']:<16}"
+        print(f"{lead}{r['count']:>7}{r['p50_ms']:>11.1f}{r['p95_ms']:>11.1f}{r['max_ms']:>11.1f}"
+              f"{r['total_ms'] / 1000:>10.2f}{r['retries']:>9}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()